@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Child, Parent, School, Student, Class, LevelRequirement
+from .models import User, Child, Parent, School, Student, Class, LevelRequirement, OutboxEmail, SchoolImportJob
 
 # Register User model with customizations
 @admin.register(User)
@@ -61,4 +61,21 @@ class SchoolAdmin(admin.ModelAdmin):
     list_display = ('name', 'city', 'email', 'supervisor')
     search_fields = ('name', 'city', 'email', 'supervisor__email')
     list_filter = ('city',)
-    raw_id_fields = ('supervisor',)
\ No newline at end of file
+    raw_id_fields = ('supervisor',)
+
+
+# Register OutboxEmail model with customizations
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipients', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    search_fields = ('subject', 'recipients')
+    list_filter = ('status',)
+    exclude = ('body', 'html_body')
+
+
+# Register SchoolImportJob model with customizations
+@admin.register(SchoolImportJob)
+class SchoolImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'school', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    raw_id_fields = ('school', 'created_by')
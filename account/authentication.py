@@ -0,0 +1,113 @@
+from functools import cached_property
+
+from django.contrib.auth import get_user_model
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+ROLE_CLAIM = "role"
+
+
+def get_user_claims(user):
+    """
+    Claims embedded in the tokens of ``user`` so that read requests can be
+    served by ``ClaimsJWTAuthentication`` without loading the user.
+    """
+    from .models import Parent, Student
+
+    claims = {
+        ROLE_CLAIM: user.role,
+        "is_staff": user.is_staff,
+        "is_superuser": user.is_superuser,
+        "student_id": None,
+        "parent_id": None,
+    }
+    if user.is_student:
+        claims["student_id"] = (
+            Student.objects.filter(user=user).values_list("pk", flat=True).first()
+        )
+    elif user.is_parent:
+        claims["parent_id"] = (
+            Parent.objects.filter(user=user).values_list("pk", flat=True).first()
+        )
+    return claims
+
+
+class ClaimsUser:
+    """
+    Request user built from the claims of an access token.
+
+    Role checks and ids are answered from the token; any other attribute is
+    read from the full ``User`` row, which is only loaded the first time such
+    an attribute is used.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+    is_active = True
+
+    def __init__(self, token):
+        self.token = token
+        self.id = self.pk = token[api_settings.USER_ID_CLAIM]
+        self.role = token[ROLE_CLAIM]
+        self.is_staff = token.get("is_staff", False)
+        self.is_superuser = token.get("is_superuser", False)
+        self.student_id = token.get("student_id")
+        self.parent_id = token.get("parent_id")
+
+    def __str__(self):
+        return f"ClaimsUser {self.pk}"
+
+    @property
+    def is_student(self):
+        return self.role == "student"
+
+    @property
+    def is_parent(self):
+        return self.role == "parent"
+
+    @property
+    def is_teacher(self):
+        return self.role == "teacher"
+
+    @property
+    def is_supervisor(self):
+        return self.role == "supervisor"
+
+    @cached_property
+    def user(self):
+        return get_user_model().objects.get(pk=self.pk)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the claims of the token on read requests
+    and exposes a ``ClaimsUser`` instead of querying the ``User`` row.
+
+    Write requests, and tokens issued before the claims were added, load the
+    user from the database as ``JWTAuthentication`` does. Deactivating a user
+    or changing their role therefore only affects their reads once their
+    access token expires. Learner data that changes, such as the grade, is
+    not put in the token.
+    """
+
+    def authenticate(self, request):
+        if request.method not in SAFE_METHODS:
+            return super().authenticate(request)
+
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if ROLE_CLAIM not in validated_token:
+            return self.get_user(validated_token), validated_token
+        return ClaimsUser(validated_token), validated_token
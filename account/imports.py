@@ -0,0 +1,345 @@
+import csv
+import io
+import uuid
+from datetime import date, datetime
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils.dateparse import parse_date
+
+from . import leaderboard
+from .models import (
+    GRADE_CHOICES,
+    LANGUAGE_CHOICES,
+    SECTION_CHOICES,
+    Class,
+    School,
+    Student,
+    User,
+)
+from .utils import generate_password
+
+# Layout of a school roster: the school on the second row, its supervisor on
+# the fourth, then a header row and one row per student.
+SCHOOL_ROW = 1
+SUPERVISOR_ROW = 3
+STUDENT_HEADER_ROW = 4
+
+STUDENT_COLUMNS = {
+    "Class": "class",
+    "Language": "language",
+    "Student Firstname": "first_name",
+    "Student Lastname": "last_name",
+    "Email": "email",
+    "Phone(optional)": "phone_number",
+    "Birthdate": "birth_date",
+}
+
+IMPORT_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+
+GRADES = {grade for grade, _ in GRADE_CHOICES}
+SECTIONS = {section for section, _ in SECTION_CHOICES}
+LANGUAGES = {language for language, _ in LANGUAGE_CHOICES}
+
+
+def _iter_xlsx_rows(file):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _iter_csv_rows(file):
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()
+
+
+def _clean(value):
+    if isinstance(value, str):
+        value = value.strip()
+    return None if value in ("", None) else value
+
+
+def _parse_class(value):
+    value = str(value)
+    digits = "".join(filter(str.isdigit, value))
+    section = "".join(filter(str.isalpha, value)).upper()
+    if not digits or int(digits) not in GRADES or section not in SECTIONS:
+        raise ValidationError(f"Invalid class '{value}'")
+    return int(digits), section
+
+
+def _parse_birth_date(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    parsed = parse_date(str(value))
+    if parsed is None:
+        raise ValidationError(f"Invalid birth date '{value}'")
+    return parsed
+
+
+class RosterReader:
+    """
+    Stream a school roster from an .xlsx workbook (read-only mode) or a CSV
+    file without loading it into memory.
+
+    The school and supervisor rows are read on construction. ``chunks()``
+    then yields lists of validated student records; rows that fail
+    validation are skipped and reported in ``errors`` with their row number.
+    """
+
+    def __init__(self, file, file_format="xlsx", chunk_size=None):
+        self.chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+        self.errors = []
+        self.error_count = 0
+        self.row_count = 0
+        reader = _iter_csv_rows if file_format == "csv" else _iter_xlsx_rows
+        self._rows = enumerate(reader(file), start=1)
+
+        header = [row for _, row in islice(self._rows, STUDENT_HEADER_ROW + 1)]
+        if len(header) <= STUDENT_HEADER_ROW:
+            raise ValueError(
+                "The roster is missing its school, supervisor or header rows"
+            )
+
+        school = [_clean(value) for value in header[SCHOOL_ROW][:3]]
+        supervisor = [_clean(value) for value in header[SUPERVISOR_ROW][:4]]
+        if not school[0] or not supervisor[2]:
+            raise ValueError("The roster must name the school and the supervisor email")
+        self.school = {"name": school[0], "city": school[1], "email": school[2]}
+        self.supervisor = {
+            "first_name": supervisor[0],
+            "last_name": supervisor[1],
+            "email": supervisor[2],
+            "phone_number": str(supervisor[3] or ""),
+        }
+
+        columns = {_clean(name): index for index, name in enumerate(header[-1])}
+        missing = [name for name in STUDENT_COLUMNS if name not in columns]
+        if missing:
+            raise ValueError(f"The roster is missing columns: {', '.join(missing)}")
+        self._columns = {
+            field: columns[name] for name, field in STUDENT_COLUMNS.items()
+        }
+
+    def _add_error(self, row_number, messages):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "errors": messages})
+
+    def records(self):
+        school_class = None
+        language = None
+        for row_number, row in self._rows:
+            values = {
+                field: _clean(row[index]) if index < len(row) else None
+                for field, index in self._columns.items()
+            }
+            errors = []
+            if values["class"] is not None:
+                try:
+                    school_class = _parse_class(values["class"])
+                except ValidationError as exc:
+                    school_class = None
+                    errors.extend(exc.messages)
+                language = values["language"] or "ru"
+                if language not in LANGUAGES:
+                    errors.append(f"Invalid language '{language}'")
+            if values["first_name"] is None:
+                if errors:
+                    self._add_error(row_number, errors)
+                continue
+
+            self.row_count += 1
+            record = self._validate_student(values, errors)
+            if school_class is None and not errors:
+                errors.append("The student is not under a valid class row")
+            if errors:
+                self._add_error(row_number, errors)
+                continue
+            record["grade"], record["section"] = school_class
+            record["language"] = language
+            yield record
+
+    def _validate_student(self, values, errors):
+        email = values["email"]
+        try:
+            validate_email(email)
+        except ValidationError:
+            errors.append(f"Invalid email '{email}'")
+
+        phone_number = str(values["phone_number"] or "")
+        if phone_number:
+            try:
+                User._meta.get_field("phone_number").run_validators(phone_number)
+            except ValidationError as exc:
+                errors.extend(exc.messages)
+
+        try:
+            birth_date = _parse_birth_date(values["birth_date"])
+        except ValidationError as exc:
+            birth_date = None
+            errors.extend(exc.messages)
+
+        if values["last_name"] is None:
+            errors.append("The student last name is missing")
+
+        return {
+            "first_name": str(values["first_name"]),
+            "last_name": str(values["last_name"] or ""),
+            "email": str(email or "").lower(),
+            "phone_number": phone_number,
+            "birth_date": birth_date,
+        }
+
+    def chunks(self):
+        records = self.records()
+        while chunk := list(islice(records, self.chunk_size)):
+            yield chunk
+
+
+def get_or_create_school(school_data, supervisor_data):
+    """
+    Return the school, its supervisor and the supervisor's new password, which
+    is ``None`` when the supervisor account already existed.
+    """
+    school, _ = School.objects.get_or_create(
+        name=school_data["name"],
+        defaults={"city": school_data["city"], "email": school_data["email"]},
+    )
+    supervisor, created = User.objects.get_or_create(
+        email__iexact=supervisor_data["email"],
+        defaults={
+            "email": supervisor_data["email"],
+            "first_name": supervisor_data["first_name"],
+            "last_name": supervisor_data["last_name"],
+            "role": "supervisor",
+            "is_active": False,
+            "phone_number": supervisor_data["phone_number"],
+        },
+    )
+    password = None
+    if created:
+        supervisor.activation_token = uuid.uuid4()
+        password = generate_password()
+        supervisor.set_password(password)
+        supervisor.save()
+
+    school.supervisor = supervisor
+    school.save()
+    return school, supervisor, password
+
+
+def import_students(school, records):
+    """
+    Create the classes, users and students of ``records`` with one bulk
+    insert per model. Existing users and students are left untouched.
+
+    Returns the counts of created rows and the ids of the new users, who
+    still need their activation email.
+    """
+    if not records:
+        return {"classes": 0, "users": 0, "students": 0}, []
+
+    with transaction.atomic():
+        classes = {
+            (school_class.grade, school_class.section): school_class
+            for school_class in Class.objects.filter(school=school)
+        }
+        new_classes = {}
+        for record in records:
+            key = (record["grade"], record["section"])
+            if key not in classes and key not in new_classes:
+                new_classes[key] = Class(
+                    school=school,
+                    grade=record["grade"],
+                    section=record["section"],
+                    language=record["language"] or "ru",
+                )
+        if new_classes:
+            Class.objects.bulk_create(new_classes.values(), ignore_conflicts=True)
+            classes = {
+                (school_class.grade, school_class.section): school_class
+                for school_class in Class.objects.filter(school=school)
+            }
+
+        # Record emails are lowercased; existing accounts are matched without
+        # regard to case, as ``EmailBackend`` authenticates them.
+        emails = {record["email"] for record in records}
+        matching_users = (
+            User.objects.annotate(email_lower=Lower("email"))
+            .filter(email_lower__in=emails)
+            .order_by("pk")
+        )
+        existing_emails = set(matching_users.values_list("email_lower", flat=True))
+        new_users = {}
+        for record in records:
+            email = record["email"]
+            if email not in existing_emails and email not in new_users:
+                new_users[email] = User(
+                    email=email,
+                    first_name=record["first_name"],
+                    last_name=record["last_name"],
+                    role="student",
+                    is_active=False,
+                    phone_number=record["phone_number"],
+                    activation_token=uuid.uuid4(),
+                )
+        User.objects.bulk_create(new_users.values(), ignore_conflicts=True)
+        users = {}
+        for user in matching_users:
+            users.setdefault(user.email_lower, user)
+
+        students_by_user = {}
+        for record in records:
+            user = users[record["email"]]
+            students_by_user.setdefault(
+                user.pk,
+                Student(
+                    user=user,
+                    school=school,
+                    school_class=classes[record["grade"], record["section"]],
+                    grade=record["grade"],
+                    language=record["language"] or "ru",
+                    birth_date=record["birth_date"],
+                ),
+            )
+        existing_students = set(
+            Student.objects.filter(user__in=students_by_user).values_list(
+                "user_id", flat=True
+            )
+        )
+        new_students = [
+            student
+            for user_id, student in students_by_user.items()
+            if user_id not in existing_students
+        ]
+        Student.objects.bulk_create(new_students, ignore_conflicts=True)
+
+    created_students = Student.objects.filter(
+        user__in=[student.user_id for student in new_students]
+    )
+    transaction.on_commit(
+        lambda: leaderboard.sync_students(created_students), robust=True
+    )
+    new_user_ids = [users[email].pk for email in new_users]
+    counts = {
+        "classes": len(new_classes),
+        "users": len(new_user_ids),
+        "students": len(new_students),
+    }
+    return counts, new_user_ids
@@ -0,0 +1,323 @@
+import threading
+from bisect import bisect_left, insort
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+KEY_PREFIX = "leaderboard:"
+INDEX_PREFIX = f"{KEY_PREFIX}index:"
+# Set of the boards that have been loaded from the database.
+POPULATED_KEY = f"{KEY_PREFIX}populated"
+
+STUDENT = "student"
+CHILD = "child"
+
+# Lua script moving a member onto a new set of boards. Reading its index set
+# and rewriting the boards in one script keeps concurrent updates of the same
+# member from interleaving. KEYS[1] is the index set, ARGV the member, its
+# score and the keys of its boards.
+SET_MEMBER_SCRIPT = """
+local member, score = ARGV[1], ARGV[2]
+local keep = {}
+for i = 3, #ARGV do keep[ARGV[i]] = true end
+for _, key in ipairs(redis.call("SMEMBERS", KEYS[1])) do
+    if not keep[key] then redis.call("ZREM", key, member) end
+end
+redis.call("DEL", KEYS[1])
+for i = 3, #ARGV do
+    redis.call("ZADD", ARGV[i], score, member)
+    redis.call("SADD", KEYS[1], ARGV[i])
+end
+"""
+
+STUDENT_BOARDS = {
+    "class": "school_class_id",
+    "school": "school_id",
+    "global": "grade",
+}
+
+
+class RedisLeaderboardStore:
+    """
+    Leaderboards kept in Redis sorted sets scored by cups.
+
+    Every member also has an index set listing the boards it is on, so moving
+    a student to another class or grade removes it from the old boards.
+    """
+
+    def __init__(self):
+        import redis
+
+        self.client = redis.Redis.from_url(
+            settings.LEADERBOARD_REDIS_URL, decode_responses=True
+        )
+        self._set_member = self.client.register_script(SET_MEMBER_SCRIPT)
+
+    def set_member(self, kind, member, keys, score):
+        index_key = f"{INDEX_PREFIX}{kind}:{member}"
+        self._set_member(keys=[index_key], args=[member, score, *keys])
+
+    def add(self, kind, key, scores):
+        if not scores:
+            return
+        pipe = self.client.pipeline()
+        pipe.zadd(key, scores)
+        for member in scores:
+            pipe.sadd(f"{INDEX_PREFIX}{kind}:{member}", key)
+        pipe.execute()
+
+    def size(self, key):
+        return self.client.zcard(key)
+
+    def is_populated(self, key):
+        return bool(self.client.sismember(POPULATED_KEY, key))
+
+    def mark_populated(self, key):
+        self.client.sadd(POPULATED_KEY, key)
+
+    def rank(self, key, member):
+        return self.client.zrevrank(key, member)
+
+    def range(self, key, start, stop):
+        return self.client.zrevrange(key, start, stop, withscores=True)
+
+    def replace_all(self, boards, memberships):
+        stale = set(self.client.scan_iter(match=f"{KEY_PREFIX}*"))
+        pipe = self.client.pipeline()
+        for key, scores in boards.items():
+            pipe.delete(key)
+            pipe.zadd(key, scores)
+            stale.discard(key)
+        for index_id, keys in memberships.items():
+            index_key = f"{INDEX_PREFIX}{index_id}"
+            pipe.delete(index_key)
+            pipe.sadd(index_key, *keys)
+            stale.discard(index_key)
+        pipe.delete(POPULATED_KEY)
+        if boards:
+            pipe.sadd(POPULATED_KEY, *boards)
+        stale.discard(POPULATED_KEY)
+        if stale:
+            pipe.delete(*stale)
+        pipe.execute()
+
+
+class LocMemLeaderboardStore:
+    """
+    In-process stand-in for the Redis store, used in development and tests.
+
+    Each board is kept sorted like a Redis sorted set, by score and then by
+    member, and read in reverse, so ties rank the same as in Redis.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._boards = {}
+        self._index = {}
+        self._populated = set()
+
+    def _board(self, key):
+        return self._boards.setdefault(key, {"scores": {}, "order": []})
+
+    def _zadd(self, key, member, score):
+        board = self._board(key)
+        self._zrem(key, member)
+        board["scores"][member] = score
+        insort(board["order"], (score, member))
+
+    def _zrem(self, key, member):
+        board = self._board(key)
+        score = board["scores"].pop(member, None)
+        if score is not None:
+            order = board["order"]
+            del order[bisect_left(order, (score, member))]
+
+    def set_member(self, kind, member, keys, score):
+        with self._lock:
+            index_id = f"{kind}:{member}"
+            for key in self._index.get(index_id, set()).difference(keys):
+                self._zrem(key, member)
+            for key in keys:
+                self._zadd(key, member, score)
+            self._index[index_id] = set(keys)
+
+    def add(self, kind, key, scores):
+        with self._lock:
+            for member, score in scores.items():
+                self._zadd(key, member, score)
+                self._index.setdefault(f"{kind}:{member}", set()).add(key)
+
+    def size(self, key):
+        return len(self._boards.get(key, {}).get("scores", {}))
+
+    def is_populated(self, key):
+        return key in self._populated
+
+    def mark_populated(self, key):
+        with self._lock:
+            self._populated.add(key)
+
+    def rank(self, key, member):
+        board = self._boards.get(key)
+        if not board or member not in board["scores"]:
+            return None
+        order = board["order"]
+        return len(order) - 1 - bisect_left(order, (board["scores"][member], member))
+
+    def range(self, key, start, stop):
+        board = self._boards.get(key)
+        if not board:
+            return []
+        order = board["order"]
+        entries = order[max(0, len(order) - 1 - stop) : max(0, len(order) - start)]
+        return [(member, score) for score, member in reversed(entries)]
+
+    def replace_all(self, boards, memberships):
+        with self._lock:
+            self._boards = {}
+            for key, scores in boards.items():
+                for member, score in scores.items():
+                    self._zadd(key, member, score)
+            self._index = {index_id: set(keys) for index_id, keys in memberships.items()}
+            self._populated = set(boards)
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    return import_string(settings.LEADERBOARD_STORE)()
+
+
+def board_key(board):
+    kind, field, value = board
+    return f"{KEY_PREFIX}{kind}:{field}:{value}"
+
+
+def student_boards(student):
+    boards = {}
+    for rating_type, field in STUDENT_BOARDS.items():
+        value = getattr(student, field)
+        boards[rating_type] = (STUDENT, field, value) if value is not None else None
+    return boards
+
+
+def child_boards(child):
+    board = (CHILD, "grade", child.grade) if child.grade is not None else None
+    return {"class": board, "school": board, "global": board}
+
+
+def _board_queryset(board):
+    from .models import Child, Student
+
+    kind, field, value = board
+    model = Student if kind == STUDENT else Child
+    return model.objects.filter(**{field: value})
+
+
+def _member_keys(boards):
+    return sorted({board_key(board) for board in boards.values() if board})
+
+
+def sync_student(student):
+    keys = _member_keys(student_boards(student))
+    get_store().set_member(STUDENT, str(student.pk), keys, student.cups)
+
+
+def sync_students(students):
+    """Add many students at once, with one write per board."""
+    boards = {}
+    for student in students:
+        for key in _member_keys(student_boards(student)):
+            boards.setdefault(key, {})[str(student.pk)] = student.cups
+    store = get_store()
+    for key, scores in boards.items():
+        store.add(STUDENT, key, scores)
+
+
+def sync_child(child):
+    keys = _member_keys(child_boards(child))
+    get_store().set_member(CHILD, str(child.pk), keys, child.cups)
+
+
+def sync_learner(learner):
+    from .models import Student
+
+    if isinstance(learner, Student):
+        sync_student(learner)
+    else:
+        sync_child(learner)
+
+
+def remove_student(student):
+    get_store().set_member(STUDENT, str(student.pk), [], 0)
+
+
+def remove_child(child):
+    get_store().set_member(CHILD, str(child.pk), [], 0)
+
+
+def get_ranking(board, member_id, cups, count=10, radius=1):
+    """
+    Return the top ``count`` entries of a board plus the entries around the
+    given member when it is ranked below them. Each entry is a dict with the
+    member ``id``, its 1-based ``rank`` and ``cups``.
+
+    Entries are ordered by cups, highest first. Learners with equal cups are
+    ordered by id compared as text, highest first, which is how Redis orders
+    equal scores in reverse.
+    """
+    store = get_store()
+    kind = board[0]
+    key = board_key(board)
+    member = str(member_id)
+
+    # Boards are loaded from the database on first use, and again after the
+    # Redis instance lost them. Saves add members to boards that were never
+    # loaded, so a board's size does not tell whether it is complete.
+    if not store.is_populated(key):
+        store.add(
+            kind,
+            key,
+            {
+                str(pk): score
+                for pk, score in _board_queryset(board).values_list("pk", "cups")
+            },
+        )
+        store.mark_populated(key)
+    rank = store.rank(key, member)
+    if rank is None:
+        store.add(kind, key, {member: cups})
+        rank = store.rank(key, member)
+
+    windows = [(0, store.range(key, 0, count - 1))]
+    if rank >= count:
+        start = max(rank - radius, count)
+        windows.append((start, store.range(key, start, rank + radius)))
+
+    return [
+        {"id": int(entry), "rank": start + offset + 1, "cups": int(score)}
+        for start, entries in windows
+        for offset, (entry, score) in enumerate(entries)
+    ]
+
+
+def rebuild_leaderboards():
+    """Repopulate every leaderboard from the database."""
+    from .models import Child, Student
+
+    boards = {}
+    memberships = {}
+    sources = (
+        (STUDENT, Student, student_boards, STUDENT_BOARDS.values()),
+        (CHILD, Child, child_boards, ["grade"]),
+    )
+    for kind, model, get_boards, fields in sources:
+        for learner in model.objects.only("cups", *fields).iterator():
+            keys = _member_keys(get_boards(learner))
+            for key in keys:
+                boards.setdefault(key, {})[str(learner.pk)] = learner.cups
+            if keys:
+                memberships[f"{kind}:{learner.pk}"] = keys
+
+    get_store().replace_all(boards, memberships)
+    return len(memberships)
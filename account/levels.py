@@ -0,0 +1,98 @@
+import threading
+from bisect import bisect_right
+
+from django.db.models import Case, F, PositiveIntegerField, Q, Value, When
+
+from vunderkids.caching import bump_version, get_versions
+
+from .profiles import invalidate_all_profiles
+
+LEVEL_TABLE_SCOPE = "level_requirements"
+
+_table_lock = threading.Lock()
+_table = None
+
+
+def _load_table():
+    from .models import LevelRequirement
+
+    # Levels are reached in order, so a level whose requirement is lower than
+    # an earlier one is only reached together with that earlier level. Keeping
+    # the running maximum makes the thresholds sorted and bisectable.
+    thresholds, levels = [], []
+    cups_required = 0
+    for level, required in LevelRequirement.objects.order_by("level").values_list(
+        "level", "cups_required"
+    ):
+        cups_required = max(cups_required, required)
+        thresholds.append(cups_required)
+        levels.append(level)
+    return thresholds, levels
+
+
+def get_level_table():
+    """
+    Return the ``(thresholds, levels)`` arrays of the level requirements.
+
+    The arrays are kept per process and reloaded when another process changes
+    the requirements, which is detected through a version stored in the cache.
+    That cache must be shared by every process, as the Redis ``CACHES`` of the
+    base settings is.
+    """
+    global _table
+    version = get_versions([LEVEL_TABLE_SCOPE])[LEVEL_TABLE_SCOPE]
+    if version is None:
+        # The cache is unavailable, so changes made elsewhere cannot be seen.
+        return _load_table()
+    table = _table
+    if table is None or table[0] != version:
+        with _table_lock:
+            table = (version, *_load_table())
+            _table = table
+    return table[1], table[2]
+
+
+def invalidate_level_table():
+    global _table
+    _table = None
+    bump_version(LEVEL_TABLE_SCOPE)
+
+
+def get_level(cups, default=1):
+    thresholds, levels = get_level_table()
+    reached = bisect_right(thresholds, cups)
+    return levels[reached - 1] if reached else default
+
+
+def recompute_levels(queryset):
+    """
+    Set the level of every learner in ``queryset`` (students or children) from
+    their cups with a single UPDATE, touching only rows whose level changes.
+    Returns the number of updated rows.
+    """
+    thresholds, levels = get_level_table()
+    if not thresholds:
+        return 0
+
+    stale = Q()
+    for index, (threshold, level) in enumerate(zip(thresholds, levels)):
+        upper = thresholds[index + 1] if index + 1 < len(thresholds) else None
+        if threshold == upper:
+            continue
+        band = Q(cups__gte=threshold) & ~Q(level=level)
+        if upper is not None:
+            band &= Q(cups__lt=upper)
+        stale |= band
+
+    new_level = Case(
+        *[
+            When(cups__gte=threshold, then=Value(level))
+            for threshold, level in reversed(list(zip(thresholds, levels)))
+        ],
+        default=F("level"),
+        output_field=PositiveIntegerField(),
+    )
+    updated = queryset.filter(stale).update(level=new_level)
+    if updated:
+        invalidate_all_profiles()
+    return updated
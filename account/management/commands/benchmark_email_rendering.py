@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
+
+from account.utils import EmailRenderer, daily_email_context
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the per-message cost of rendering the daily email with the "
+        "batch renderer against render_to_string and strip_tags."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipients", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if options["recipients"] < 1:
+            raise CommandError("--recipients must be positive")
+        contexts = [
+            daily_email_context(f"Name{i}", f"Surname{i}", i * 5, i % 20 + 1)
+            for i in range(options["recipients"])
+        ]
+
+        def per_call(context):
+            html_content = render_to_string("daily_email.html", context)
+            return html_content, strip_tags(html_content)
+
+        renderer = EmailRenderer("daily_email", "Daily Update")
+        for label, render in (
+            ("render_to_string + strip_tags", per_call),
+            ("EmailRenderer", renderer.render),
+        ):
+            started = time.perf_counter()
+            for context in contexts:
+                render(context)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{label}: {elapsed:.2f}s total, "
+                f"{elapsed / len(contexts) * 1e6:.0f}µs per message"
+            )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from account.leaderboard import rebuild_leaderboards
+
+
+class Command(BaseCommand):
+    help = "Repopulate the class, school and grade leaderboards from the database."
+
+    def handle(self, *args, **options):
+        count = rebuild_leaderboards()
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt leaderboards for {count} learners.")
+        )
@@ -1,6 +1,8 @@
 from datetime import date, timedelta
 from django.utils import timezone
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -8,6 +10,7 @@ from django.contrib.auth.models import (
 )
 from django.core.validators import RegexValidator
 from django.conf import settings
+from .levels import get_level
 
 GRADE_CHOICES = [(i, str(i)) for i in range(0, 5)]
 SECTION_CHOICES = [(chr(i), chr(i)) for i in range(ord("А"), ord("Я") + 1)]
@@ -23,6 +26,20 @@ LANGUAGE_CHOICES = [
 ]
 
 
+def get_streak_changes(streak, last_task_completed_at, now):
+    """Return the streak fields to update when a task is completed at ``now``."""
+    if last_task_completed_at:
+        if now.date() == last_task_completed_at.date():
+            return {}
+        elif now.date() == (last_task_completed_at + timedelta(days=1)).date():
+            streak += 1
+        else:
+            streak = 1
+    else:
+        streak = 1
+    return {"streak": streak, "last_task_completed_at": now}
+
+
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
@@ -178,25 +195,19 @@ class Student(models.Model):
         return f"[Student: {self.pk}] {self.user.first_name} {self.user.last_name}"
 
     def update_level(self):
-        for requirement in LevelRequirement.objects.order_by("level"):
-            if self.cups >= requirement.cups_required:
-                self.level = requirement.level
-            else:
-                break
-        self.save()
+        level = get_level(self.cups, default=self.level)
+        if level != self.level:
+            self.level = level
+            self.save(update_fields=["level"])
 
     def update_streak(self):
-        now = timezone.now()
-        if self.last_task_completed_at:
-            if now.date() == self.last_task_completed_at.date():
-                return
-            elif now.date() == (self.last_task_completed_at + timedelta(days=1)).date():
-                self.streak += 1
-            else:
-                self.streak = 1
-        else:
-            self.streak = 1
-        self.last_task_completed_at = now
+        changes = get_streak_changes(
+            self.streak, self.last_task_completed_at, timezone.now()
+        )
+        if not changes:
+            return
+        for field, value in changes.items():
+            setattr(self, field, value)
         self.save()
 
     def add_question_reward(self):
@@ -213,6 +224,27 @@ class Parent(models.Model):
         return f"[Parent] {self.user.first_name} {self.user.last_name}"
 
 
+class ChildQuerySet(models.QuerySet):
+    def with_profile(self):
+        """
+        Load everything ``ChildSerializer`` shows along with the children: the
+        parent's user and subscription plan, and the completed task count as
+        ``tasks_completed``.
+        """
+        from tasks.models import TaskCompletion
+
+        completed = (
+            TaskCompletion.objects.filter(child=OuterRef("pk"))
+            .order_by()
+            .values("child")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        return self.select_related("parent__user__subscription__plan").annotate(
+            tasks_completed=Coalesce(Subquery(completed), 0)
+        )
+
+
 class Child(models.Model):
     parent = models.ForeignKey(
         Parent, on_delete=models.CASCADE, related_name="children"
@@ -230,29 +262,25 @@ class Child(models.Model):
     birth_date = models.DateField(default=date(2015, 1, 1))
     last_task_completed_at = models.DateTimeField(null=True, blank=True)
 
+    objects = ChildQuerySet.as_manager()
+
     def __str__(self):
         return f"[Child: {self.pk}] {self.first_name} {self.last_name}"
 
     def update_level(self):
-        for requirement in LevelRequirement.objects.order_by("level"):
-            if self.cups >= requirement.cups_required:
-                self.level = requirement.level
-            else:
-                break
-        self.save()
+        level = get_level(self.cups, default=self.level)
+        if level != self.level:
+            self.level = level
+            self.save(update_fields=["level"])
 
     def update_streak(self):
-        now = timezone.now()
-        if self.last_task_completed_at:
-            if now.date() == self.last_task_completed_at.date():
-                return
-            elif now.date() == (self.last_task_completed_at + timedelta(days=1)).date():
-                self.streak += 1
-            else:
-                self.streak = 1
-        else:
-            self.streak = 1
-        self.last_task_completed_at = now
+        changes = get_streak_changes(
+            self.streak, self.last_task_completed_at, timezone.now()
+        )
+        if not changes:
+            return
+        for field, value in changes.items():
+            setattr(self, field, value)
         self.save()
 
     def add_question_reward(self):
@@ -260,3 +288,71 @@ class Child(models.Model):
         self.cups += question_reward
         self.stars += question_reward
         self.save()
+
+
+class OutboxEmail(models.Model):
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (SENDING, "Sending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255)
+    recipients = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
+
+
+class SchoolImportJob(models.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    file = models.FileField(upload_to="school_imports/")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="school_imports",
+    )
+    school = models.ForeignKey(
+        School,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="imports",
+    )
+    result = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"School import {self.pk} ({self.status})"
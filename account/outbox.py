@@ -0,0 +1,187 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+OUTBOX_RATE_KEY = "email_outbox_rate"
+
+
+def queue_emails(datatuple):
+    """
+    Store ``(subject, text, html, from_email, recipient_list)`` tuples in the
+    outbox. Returns the created ``OutboxEmail`` rows.
+    """
+    return OutboxEmail.objects.bulk_create(
+        OutboxEmail(
+            subject=subject,
+            body=text_content,
+            html_body=html_content,
+            from_email=from_email,
+            recipients=list(recipient_list),
+        )
+        for subject, text_content, html_content, from_email, recipient_list in datatuple
+    )
+
+
+def _build_message(email, connection):
+    message = EmailMultiAlternatives(
+        email.subject,
+        email.body,
+        email.from_email,
+        email.recipients,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, "text/html")
+    return message
+
+
+def _retry_delay(attempts):
+    return timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def _claim_batch(batch_size):
+    """
+    Mark up to ``batch_size`` due messages as being sent by this worker.
+
+    A claim is a lease: a worker that dies mid-batch leaves its messages in
+    ``sending`` until ``next_attempt_at`` passes, after which they are due
+    again.
+    """
+    now = timezone.now()
+    due = OutboxEmail.objects.filter(
+        status__in=[OutboxEmail.PENDING, OutboxEmail.SENDING],
+        next_attempt_at__lte=now,
+    )
+    with transaction.atomic():
+        ids = list(
+            due.select_for_update(skip_locked=True)
+            .order_by("next_attempt_at", "pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        OutboxEmail.objects.filter(pk__in=ids).update(
+            status=OutboxEmail.SENDING,
+            next_attempt_at=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE),
+        )
+    return list(OutboxEmail.objects.filter(pk__in=ids).order_by("pk"))
+
+
+class _RateBudget:
+    """
+    Per-second send budget shared by every worker through the cache.
+
+    Each send takes a slot in the current second, or in the first later
+    second that still has one, and waits until that second starts.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+
+    def _take(self, second):
+        key = f"{OUTBOX_RATE_KEY}:{second}"
+        cache.add(key, 0, 60)
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, 60)
+            return 1
+        # ``None`` when the cache is unavailable; sending is then not limited.
+        return count or 0
+
+    def wait(self):
+        if not self.rate:
+            return
+        now = time.time()
+        second = int(now)
+        while self._take(second) > self.rate:
+            second += 1
+        if second > now:
+            time.sleep(second - now)
+
+
+def _clear_content(email):
+    # Activation emails carry plaintext passwords, so the content is only kept
+    # for as long as the message may still be sent.
+    email.body = ""
+    email.html_body = ""
+
+
+def _send(email, connection):
+    try:
+        # Opening is a no-op while the connection from a previous send is up.
+        connection.open()
+        connection.send_messages([_build_message(email, connection)])
+    except Exception as exc:
+        connection.close()
+        email.attempts += 1
+        email.last_error = str(exc)
+        if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            email.status = OutboxEmail.FAILED
+            _clear_content(email)
+        else:
+            email.status = OutboxEmail.PENDING
+            email.next_attempt_at = timezone.now() + _retry_delay(email.attempts)
+        email.save(
+            update_fields=[
+                "status",
+                "attempts",
+                "last_error",
+                "next_attempt_at",
+                "body",
+                "html_body",
+            ]
+        )
+        return False
+
+    email.status = OutboxEmail.SENT
+    email.sent_at = timezone.now()
+    _clear_content(email)
+    email.save(update_fields=["status", "sent_at", "body", "html_body"])
+    return True
+
+
+def send_outbox(batch_size=None, rate=None):
+    """
+    Send every due message in the outbox over one long-lived connection, at
+    most ``rate`` messages per second. Failed messages are retried later with
+    exponential backoff and given up after ``EMAIL_OUTBOX_MAX_ATTEMPTS``.
+
+    Several workers may drain the outbox at once; they claim separate
+    batches and share one rate budget. Returns ``(sent, failed)`` counts.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    rate = settings.EMAIL_OUTBOX_RATE if rate is None else rate
+
+    sent = failed = 0
+    budget = _RateBudget(rate)
+    connection = get_connection(fail_silently=False)
+    try:
+        while batch := _claim_batch(batch_size):
+            for email in batch:
+                budget.wait()
+                if _send(email, connection):
+                    sent += 1
+                else:
+                    failed += 1
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def purge_outbox(days=None):
+    """
+    Delete sent and failed messages older than ``days`` (by default
+    ``EMAIL_OUTBOX_RETENTION_DAYS``). Returns the number of deleted rows.
+    """
+    days = settings.EMAIL_OUTBOX_RETENTION_DAYS if days is None else days
+    deleted, _ = OutboxEmail.objects.filter(
+        status__in=[OutboxEmail.SENT, OutboxEmail.FAILED],
+        created_at__lt=timezone.now() - timedelta(days=days),
+    ).delete()
+    return deleted
@@ -1,6 +1,8 @@
 from rest_framework.permissions import IsAuthenticated, BasePermission, SAFE_METHODS
 from rest_framework.exceptions import PermissionDenied
 
+from subscription.cache import has_active_subscription
+
 
 class IsSuperUser(IsAuthenticated):
     def has_permission(self, request, view):
@@ -42,10 +44,7 @@ class HasSubscription(IsAuthenticated):
             return False
 
         if request.user.is_student or request.user.is_parent:
-            if not hasattr(request.user, 'subscription'):
-                raise PermissionDenied("You do not have an active subscription.")
-
-            if not request.user.subscription.is_active:
+            if not has_active_subscription(request.user.pk):
                 raise PermissionDenied("You do not have an active subscription.")
             
         return True
\ No newline at end of file
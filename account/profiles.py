@@ -0,0 +1,88 @@
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from vunderkids.caching import bump_version, get_versions, version_key
+
+PROFILE_SCOPE = "profiles"
+PROFILE_TIMEOUT = 60 * 60
+
+
+def _profile_key(user_id):
+    return f"user_profile:{user_id}"
+
+
+def _timeout(expires_at):
+    """Keep a snapshot no longer than the subscription it reports on."""
+    if expires_at is None:
+        return PROFILE_TIMEOUT
+    remaining = (expires_at - timezone.now()).total_seconds()
+    return max(0, min(PROFILE_TIMEOUT, int(remaining)))
+
+
+def get_profile(user_id, build):
+    """
+    Return the cached profile snapshot of a user, or build and cache it.
+
+    ``build`` returns ``(data, expires_at)``, where ``expires_at`` is when the
+    data goes stale on its own (the end of the subscription), or ``None``.
+    A snapshot is also stale once the global profile version is bumped.
+    """
+    profile_key = _profile_key(user_id)
+    scope_key = version_key(PROFILE_SCOPE)
+    stored = cache.get_many([profile_key, scope_key])
+    version = stored.get(scope_key)
+    if version is None:
+        version = get_versions([PROFILE_SCOPE])[PROFILE_SCOPE]
+    if version is None:
+        # The cache is unavailable.
+        return build()[0]
+
+    snapshot = stored.get(profile_key)
+    if snapshot is not None and snapshot["version"] == version:
+        return snapshot["data"]
+
+    data, expires_at = build()
+    timeout = _timeout(expires_at)
+    if timeout:
+        cache.set(profile_key, {"version": version, "data": data}, timeout)
+    return data
+
+
+def invalidate_profile(user_id):
+    cache.delete(_profile_key(user_id))
+    # Deleted again on commit, so a request that read the old rows in the
+    # meantime cannot leave a stale snapshot cached.
+    transaction.on_commit(partial(cache.delete, _profile_key(user_id)), robust=True)
+
+
+def invalidate_parent_profile(parent_id):
+    from .models import Parent
+
+    user_id = (
+        Parent.objects.filter(pk=parent_id).values_list("user_id", flat=True).first()
+    )
+    if user_id is not None:
+        invalidate_profile(user_id)
+
+
+def invalidate_learner_profile(user_id=None, child_id=None):
+    """Invalidate the profile showing a student (``user_id``) or a child."""
+    from .models import Child
+
+    if user_id is not None:
+        invalidate_profile(user_id)
+        return
+    parent_user_id = (
+        Child.objects.filter(pk=child_id)
+        .values_list("parent__user_id", flat=True)
+        .first()
+    )
+    if parent_user_id is not None:
+        invalidate_profile(parent_user_id)
+
+
+def invalidate_all_profiles():
+    bump_version(PROFILE_SCOPE)
@@ -1,12 +1,18 @@
 from django.conf import settings
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError as DjangoValidationError
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
 from account.models import *
 from subscription.models import Subscription, Plan
+from .authentication import get_user_claims
 from .tasks import send_activation_email
 from .utils import generate_password, get_presigned_url
 
@@ -289,6 +295,12 @@ class SimpleStudentSerializer(serializers.ModelSerializer):
         ]
 
 
+class SchoolImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SchoolImportJob
+        fields = ["id", "status", "school", "result", "error", "created_at", "finished_at"]
+
+
 class ClassSerializer(serializers.ModelSerializer):
     class Meta:
         model = Class
@@ -305,7 +317,18 @@ class ChildSerializer(serializers.ModelSerializer):
         model = Child
         fields = "__all__"
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Every child of a parent shares the parent's subscription, so it is
+        # looked at once per parent rather than once per field and child.
+        self._subscriptions = {}
+
     def check_subscription_and_free_trial(self, obj):
+        if obj.parent_id not in self._subscriptions:
+            self._subscriptions[obj.parent_id] = self._get_subscription_info(obj)
+        return self._subscriptions[obj.parent_id]
+
+    def _get_subscription_info(self, obj):
         parent = obj.parent
         has_subscription = hasattr(parent.user, "subscription")
         active_subscription = parent.user.subscription if has_subscription else None
@@ -326,6 +349,9 @@ class ChildSerializer(serializers.ModelSerializer):
         return is_free_trial
 
     def get_tasks_completed(self, obj):
+        # Annotated by ``Child.objects.with_profile()``.
+        if hasattr(obj, "tasks_completed"):
+            return obj.tasks_completed
         return obj.completed_tasks.count()
 
     def get_email(self, obj):
@@ -336,7 +362,8 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
-        # Add any additional token customization here if needed
+        for claim, value in get_user_claims(user).items():
+            token[claim] = value
         return token
 
     def validate(self, attrs):
@@ -366,7 +393,7 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
                 }
             elif self.user.is_parent:
                 parent = self.user.parent
-                children = Child.objects.filter(parent=parent)
+                children = Child.objects.filter(parent=parent).with_profile()
                 data["user"] = {
                     "id": self.user.id,
                     "email": self.user.email,
@@ -403,3 +430,17 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
             )  # Customize error message as needed
 
         return data
+
+
+class MyTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh the user claims along with the access token."""
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data["access"])
+        user = User.objects.filter(pk=access[jwt_settings.USER_ID_CLAIM]).first()
+        if user is not None:
+            for claim, value in get_user_claims(user).items():
+                access[claim] = value
+            data["access"] = str(access)
+        return data
@@ -0,0 +1,66 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from vunderkids.caching import bump_version, learner_scope
+from . import leaderboard
+from .levels import invalidate_level_table
+from .models import Child, LevelRequirement, Student, User
+from .profiles import invalidate_parent_profile, invalidate_profile
+
+
+@receiver(post_save, sender=LevelRequirement)
+@receiver(post_delete, sender=LevelRequirement)
+def invalidate_levels(sender, **kwargs):
+    invalidate_level_table()
+
+
+@receiver(post_save, sender=Student)
+def sync_student_leaderboards(sender, instance, **kwargs):
+    transaction.on_commit(partial(leaderboard.sync_student, instance), robust=True)
+
+
+@receiver(post_delete, sender=Student)
+def remove_student_leaderboards(sender, instance, **kwargs):
+    transaction.on_commit(partial(leaderboard.remove_student, instance), robust=True)
+
+
+@receiver(post_save, sender=Child)
+def sync_child_leaderboards(sender, instance, **kwargs):
+    transaction.on_commit(partial(leaderboard.sync_child, instance), robust=True)
+
+
+@receiver(post_delete, sender=Child)
+def remove_child_leaderboards(sender, instance, **kwargs):
+    transaction.on_commit(partial(leaderboard.remove_child, instance), robust=True)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def invalidate_student_responses(sender, instance, **kwargs):
+    bump_version(learner_scope(user_id=instance.user_id))
+
+
+@receiver(post_save, sender=Child)
+@receiver(post_delete, sender=Child)
+def invalidate_child_responses(sender, instance, **kwargs):
+    bump_version(learner_scope(child_id=instance.pk))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_profile(sender, instance, **kwargs):
+    invalidate_profile(instance.pk)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def invalidate_student_profile(sender, instance, **kwargs):
+    invalidate_profile(instance.user_id)
+
+
+@receiver(post_save, sender=Child)
+@receiver(post_delete, sender=Child)
+def invalidate_child_profile(sender, instance, **kwargs):
+    invalidate_parent_profile(instance.parent_id)
@@ -1,123 +1,194 @@
-from celery import shared_task
-from django.core.mail import EmailMultiAlternatives, get_connection
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from celery import chord, group, shared_task
+from django.db import transaction
 from django.conf import settings
+from django.contrib.auth.hashers import make_password
 from django.utils import timezone
-from account.models import Child, Student, Parent, User
+from django.db.models import Exists, OuterRef, Q
+from account.imports import RosterReader, get_or_create_school, import_students
+from account.models import Child, Student, Parent, SchoolImportJob, User
 from subscription.models import Subscription
-from account.utils import generate_password, render_email
+from account.outbox import purge_outbox, queue_emails, send_outbox
+from account.profiles import invalidate_all_profiles
+from account.utils import (
+    EmailRenderer,
+    daily_email_context,
+    generate_password,
+)
 from django.utils import timezone
 from datetime import timedelta, time
+from itertools import islice
 import uuid
 
 frontend_url = settings.FRONTEND_URL
 
+ACTIVATION_SUBJECT = "Activate your Vunderkids Account"
 
-def send_mass_html_mail(datatuple, fail_silently=False):
-    messages = []
-    for subject, text_content, html_content, from_email, recipient_list in datatuple:
-        msg = EmailMultiAlternatives(subject, text_content, from_email, recipient_list)
-        msg.attach_alternative(html_content, "text/html")
-        messages.append(msg)
 
-    try:
-        # Try sending all messages in bulk
-        connection = get_connection(fail_silently=fail_silently)
-        connection.send_messages(messages)
-    except Exception as e:
-        # If there is an issue, fallback to sending individually
-        if not fail_silently:
-            raise e
-        for message in messages:
-            try:
-                message.send(fail_silently=fail_silently)
-            except Exception as single_email_exception:
-                if not fail_silently:
-                    raise single_email_exception
-
-    return len(messages)
+def send_mass_html_mail(datatuple):
+    """
+    Queue ``(subject, text, html, from_email, recipient_list)`` tuples in the
+    email outbox and wake the outbox worker once they are committed.
+    """
+    count = len(queue_emails(datatuple))
+    if count:
+        transaction.on_commit(send_outbox_emails.delay)
+    return count
+
+
+@shared_task
+def send_outbox_emails():
+    sent, failed = send_outbox()
+    return f"Sent {sent} emails, {failed} failed"
 
 
 @shared_task
-def send_daily_email_to_all_students():
-    students = Student.objects.all().select_related("user")
-    datatuple = []
-    for student in students:
-        if student.user.is_active:  # Ensure we only email active users
-            html_content, text_content = render_email(
+def purge_outbox_emails():
+    return f"Deleted {purge_outbox()} outbox emails"
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _id_ranges(queryset, chunk_size):
+    """Yield ``(first_id, last_id)`` pairs spanning ``chunk_size`` rows each."""
+    ids = queryset.order_by("pk").values_list("pk", flat=True)
+    for chunk in _chunked(ids.iterator(chunk_size=chunk_size), chunk_size):
+        yield chunk[0], chunk[-1]
+
+
+DAILY_EMAIL_CHUNK_SIZE = 500
+
+
+def _daily_email_students():
+    return Student.objects.filter(user__is_active=True)
+
+
+def _daily_email_parents():
+    return Parent.objects.filter(
+        Exists(Child.objects.filter(parent=OuterRef("pk"))), user__is_active=True
+    )
+
+
+@shared_task
+def send_daily_student_emails(first_id, last_id):
+    students = _daily_email_students().filter(pk__range=(first_id, last_id))
+    renderer = EmailRenderer("daily_email", "Daily Update")
+    datatuple = [
+        renderer.message(
+            daily_email_context(
                 student.user.first_name,
                 student.user.last_name,
                 student.cups,
                 student.level,
-            )
-            msg = (
-                "Daily Update",
-                text_content,
-                html_content,
-                settings.DEFAULT_FROM_EMAIL,
-                [student.user.email],
-            )
-            datatuple.append(msg)
-
-    if datatuple:
-        send_mass_html_mail(datatuple, fail_silently=False)
+            ),
+            student.user.email,
+        )
+        for student in students.select_related("user")
+    ]
+    return send_mass_html_mail(datatuple)
 
 
 @shared_task
-def send_daily_email_to_all_parents():
-    parents = Parent.objects.all().select_related("user").prefetch_related("children")
-    datatuple = []
-    for parent in parents:
-        if (
-            parent.user.is_active and parent.children.exists()
-        ):  # Ensure the parent is active and has children
-            context = {
+def send_daily_parent_emails(first_id, last_id):
+    parents = _daily_email_parents().filter(pk__range=(first_id, last_id))
+    renderer = EmailRenderer("parent_email_template", "Your Children’s Daily Update")
+    datatuple = [
+        renderer.message(
+            {
                 "first_name": parent.user.first_name,
                 "last_name": parent.user.last_name,
                 "children": parent.children.all(),
-            }
-            html_content = render_to_string("parent_email_template.html", context)
-            text_content = strip_tags(html_content)
-            msg = (
-                "Your Children’s Daily Update",
-                text_content,
-                html_content,
-                settings.DEFAULT_FROM_EMAIL,
-                [parent.user.email],
-            )
-            datatuple.append(msg)
+            },
+            parent.user.email,
+        )
+        for parent in parents.select_related("user").prefetch_related("children")
+    ]
+    return send_mass_html_mail(datatuple)
+
+
+@shared_task
+def summarize_daily_emails(results, audience):
+    return f"Sent {sum(results)} daily emails to {audience} in {len(results)} chunks"
+
 
-    if datatuple:
-        send_mass_html_mail(datatuple, fail_silently=False)
+def _fan_out_daily_emails(queryset, chunk_task, audience, chunk_size):
+    chunks = [
+        chunk_task.si(first_id, last_id)
+        for first_id, last_id in _id_ranges(queryset, chunk_size)
+    ]
+    if chunks:
+        chord(chunks)(summarize_daily_emails.s(audience))
+    return len(chunks)
 
 
 @shared_task
-def send_mass_activation_email(user_ids):
-    users = User.objects.filter(id__in=user_ids)
-    datatuple = []
+def send_daily_email_to_all_students(chunk_size=DAILY_EMAIL_CHUNK_SIZE):
+    """Queue one email task per ``chunk_size`` active students."""
+    return _fan_out_daily_emails(
+        _daily_email_students(), send_daily_student_emails, "students", chunk_size
+    )
+
+
+@shared_task
+def send_daily_email_to_all_parents(chunk_size=DAILY_EMAIL_CHUNK_SIZE):
+    """Queue one email task per ``chunk_size`` active parents with children."""
+    return _fan_out_daily_emails(
+        _daily_email_parents(), send_daily_parent_emails, "parents", chunk_size
+    )
+
+
+ACTIVATION_CHUNK_SIZE = 100
+
 
-    for user in users:
-        password = generate_password()
-        user.set_password(password)
+def _activate_users(user_ids):
+    users = list(User.objects.filter(id__in=user_ids))
+    passwords = [generate_password() for _ in users]
+    expires_at = timezone.now() + timedelta(days=1)
+    for user, password in zip(users, passwords):
+        user.password = make_password(password)
         user.activation_token = uuid.uuid4()
-        user.activation_token_expires_at = timezone.now() + timedelta(days=1)
-        user.save()
-        activation_url = f"{frontend_url}activate/{user.activation_token}/"
-        context = {"user": user, "activation_url": activation_url, "password": password}
-        subject = "Activate your Vunderkids Account"
-        html_message = render_to_string("activation_email.html", context)
-        plain_message = strip_tags(html_message)
-        msg = (
-            subject,
-            plain_message,
-            html_message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
+        user.activation_token_expires_at = expires_at
+    User.objects.bulk_update(
+        users, ["password", "activation_token", "activation_token_expires_at"]
+    )
+
+    renderer = EmailRenderer("activation_email", ACTIVATION_SUBJECT)
+    datatuple = [
+        renderer.message(
+            {
+                "user": user,
+                "activation_url": f"{frontend_url}activate/{user.activation_token}/",
+                "password": password,
+            },
+            user.email,
         )
-        datatuple.append(msg)
+        for user, password in zip(users, passwords)
+    ]
+    return send_mass_html_mail(datatuple)
+
+
+@shared_task
+def send_activation_chunk(user_ids):
+    return _activate_users(user_ids)
+
+
+@shared_task
+def send_mass_activation_email(user_ids):
+    """
+    Give every user a new password and activation token and email them.
 
-    send_mass_html_mail(datatuple, fail_silently=False)
+    Large batches are split into chunks hashed by separate tasks, so the
+    password hashing runs on all available workers.
+    """
+    if len(user_ids) <= ACTIVATION_CHUNK_SIZE:
+        return _activate_users(user_ids)
+    group(
+        send_activation_chunk.si(chunk)
+        for chunk in _chunked(user_ids, ACTIVATION_CHUNK_SIZE)
+    ).apply_async()
 
 
 @shared_task
@@ -128,15 +199,8 @@ def send_activation_email(user_id, password):
     user.save()
     activation_url = f"{frontend_url}activate/{user.activation_token}/"
     context = {"user": user, "activation_url": activation_url, "password": password}
-    subject = "Activate your Vunderkids Account"
-    html_message = render_to_string("activation_email.html", context)
-    plain_message = strip_tags(html_message)
-    from_email = settings.DEFAULT_FROM_EMAIL
-    to = user.email
-
-    msg = EmailMultiAlternatives(subject, plain_message, from_email, [to])
-    msg.attach_alternative(html_message, "text/html")
-    msg.send()
+    renderer = EmailRenderer("activation_email", ACTIVATION_SUBJECT)
+    send_mass_html_mail([renderer.message(context, user.email)])
 
 
 @shared_task
@@ -144,86 +208,121 @@ def send_password_reset_request_email(user_id):
     user = User.objects.get(pk=user_id)
     reset_password_url = f"{frontend_url}reset-password/{user.reset_password_token}/"
     context = {"user": user, "reset_password_url": reset_password_url}
-    subject = "Password reset Vunderkids account"
-    html_message = render_to_string("password_reset_request_email.html", context)
-    plain_message = strip_tags(html_message)
-    from_email = settings.DEFAULT_FROM_EMAIL
-    to = user.email
+    renderer = EmailRenderer(
+        "password_reset_request_email", "Password reset Vunderkids account"
+    )
+    send_mass_html_mail([renderer.message(context, user.email)])
 
-    msg = EmailMultiAlternatives(subject, plain_message, from_email, [to])
-    msg.attach_alternative(html_message, "text/html")
-    msg.send()
 
+@shared_task
+def check_streaks():
+    """
+    Reset the streak of every learner who has not completed a task today.
+    Runs one UPDATE per learner table and returns how many rows were reset.
+    """
+    start_of_today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    lost_streak = Q(last_task_completed_at__lt=start_of_today) | Q(
+        last_task_completed_at__isnull=True
+    )
+
+    reset = {
+        "students": Student.objects.filter(lost_streak)
+        .exclude(streak=0)
+        .update(streak=0),
+        "children": Child.objects.filter(lost_streak)
+        .exclude(streak=0)
+        .update(streak=0),
+    }
+    if any(reset.values()):
+        invalidate_all_profiles()
+    return reset
 
-def is_losing_streak(last_date):
-    now = timezone.now()
-    today = now.date()
 
-    if last_date != today:
-        return True
-    return False
+@shared_task
+def send_subscription_expired_emails(user_ids):
+    renderer = EmailRenderer(
+        "subscription_expired_email", "Your subscription has expired"
+    )
+    datatuple = [
+        renderer.message({"user": user}, user.email)
+        for user in User.objects.filter(pk__in=user_ids)
+    ]
+    return send_mass_html_mail(datatuple)
 
 
-@shared_task
-def check_streaks():
-    now = timezone.now()
-    today = now.date()
-
-    students = Student.objects.all()
-    for student in students:
-        if student.last_task_completed_at:
-            last_date = student.last_task_completed_at.date()
-            if is_losing_streak(last_date):
-                student.streak = 0
-                student.save()
-            else:
-                return
-        else:
-            student.streak = 0
-            student.save()
-
-    parents = Parent.objects.all()
-    for parent in parents:
-        for child in parent.children.all():
-            if child.last_task_completed_at:
-                last_date = child.last_task_completed_at.date()
-                if is_losing_streak(last_date):
-                    child.streak = 0
-                    child.save()
-                else:
-                    return
-            else:
-                child.streak = 0
-                child.save()
+EXPIRED_SUBSCRIPTIONS_CHUNK_SIZE = 1000
 
 
 @shared_task
-def delete_expired_subscriptions():
-    subscriptions = Subscription.objects.all().select_related("user")
-
-    inactive_subscriptions = [sub for sub in subscriptions if not sub.is_active]
-
-    datatuple = []
-    for subscription in inactive_subscriptions:
-        user = subscription.user
-        context = {"user": user}
-        html_message = render_to_string("subscription_expired_email.html", context)
-        plain_message = strip_tags(html_message)
-        msg = (
-            "Your subscription has expired",
-            plain_message,
-            html_message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-        )
-        datatuple.append(msg)
+def delete_expired_subscriptions(chunk_size=EXPIRED_SUBSCRIPTIONS_CHUNK_SIZE):
+    """
+    Delete subscriptions that ended before now, streaming them in chunks and
+    queueing the expiry emails of each chunk as a separate task.
+    """
+    expired = Q(end_date__lte=timezone.now()) | Q(end_date__isnull=True)
+    rows = (
+        Subscription.objects.filter(expired)
+        .order_by()
+        .values_list("pk", "user_id")
+        .iterator(chunk_size=chunk_size)
+    )
+
+    count = 0
+    for chunk in _chunked(rows, chunk_size):
+        subscription_ids, user_ids = zip(*chunk)
+        deleted, _ = Subscription.objects.filter(
+            expired, pk__in=subscription_ids
+        ).delete()
+        send_subscription_expired_emails.delay(list(user_ids))
+        count += deleted
 
-    # Send all emails
-    send_mass_html_mail(datatuple, fail_silently=False)
+    return f"Deleted {count} expired subscriptions"
 
-    # Delete expired subscriptions
-    count = len(inactive_subscriptions)
-    for subscription in inactive_subscriptions:
-        subscription.delete()
 
-    return f"Deleted {count} expired subscriptions"
+@shared_task
+def import_school(job_id):
+    """
+    Run a school roster upload queued by ``SchoolViewSet.upload_excel``.
+
+    The roster is streamed in chunks, each imported in its own transaction,
+    and the running totals are saved on the job after every chunk so its
+    progress can be polled. Invalid rows are skipped and listed in the result.
+    """
+    job = SchoolImportJob.objects.get(pk=job_id)
+    job.status = SchoolImportJob.RUNNING
+    job.save(update_fields=["status"])
+
+    file_format = "csv" if job.file.name.lower().endswith(".csv") else "xlsx"
+    totals = {"rows": 0, "classes": 0, "users": 0, "students": 0}
+    try:
+        with job.file.open("rb") as roster_file:
+            reader = RosterReader(roster_file, file_format=file_format)
+            school, supervisor, password = get_or_create_school(
+                reader.school, reader.supervisor
+            )
+            if password:
+                send_activation_email.delay(supervisor.pk, password)
+            job.school = school
+            for records in reader.chunks():
+                counts, new_user_ids = import_students(school, records)
+                if new_user_ids:
+                    send_mass_activation_email.delay(new_user_ids)
+                for name, count in counts.items():
+                    totals[name] += count
+                totals["rows"] += len(records)
+                job.result = {**totals, "invalid_rows": reader.error_count}
+                job.save(update_fields=["school", "result"])
+    except Exception as exc:
+        job.status = SchoolImportJob.FAILED
+        job.error = str(exc)
+    else:
+        job.status = SchoolImportJob.DONE
+        job.result = {
+            **totals,
+            "invalid_rows": reader.error_count,
+            "errors": reader.errors,
+        }
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "school", "result", "error", "finished_at"])
+    return job.status
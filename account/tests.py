@@ -1,3 +1,829 @@
-from django.test import TestCase
+import csv
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib import admin
+from django.core import mail
+from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from account import leaderboard
+from account.authentication import ClaimsUser
+from account.profiles import get_profile
+from account.serializers import ChildSerializer
+from account.levels import get_level, recompute_levels
+from account.outbox import purge_outbox, queue_emails, send_outbox
+from account.utils import EmailRenderer, daily_email_context
+from account.tasks import (
+    import_school,
+    check_streaks,
+    delete_expired_subscriptions,
+    send_daily_email_to_all_parents,
+    send_daily_email_to_all_students,
+    send_daily_parent_emails,
+    send_daily_student_emails,
+    send_mass_activation_email,
+)
+from account.models import OutboxEmail, SchoolImportJob, Child, Class, LevelRequirement, Parent, School, Student, User
+from subscription.models import Plan, Subscription
+from tasks.admin import TaskCompletionAdmin
+from tasks.models import Chapter, Course, DailyActivity, Question, Section, Task, TaskCompletion
+
+
+class LevelTableTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        LevelRequirement.objects.create(level=1, cups_required=0)
+        LevelRequirement.objects.create(level=2, cups_required=50)
+        LevelRequirement.objects.create(level=3, cups_required=120)
+
+    def test_get_level_bisects_thresholds(self):
+        self.assertEqual(get_level(0), 1)
+        self.assertEqual(get_level(49), 1)
+        self.assertEqual(get_level(50), 2)
+        self.assertEqual(get_level(500), 3)
+        with self.assertNumQueries(0):
+            get_level(60)
+
+    def test_table_is_reloaded_after_requirement_change(self):
+        self.assertEqual(get_level(100), 2)
+        requirement = LevelRequirement.objects.get(level=3)
+        requirement.cups_required = 100
+        requirement.save()
+        self.assertEqual(get_level(100), 3)
+
+    def test_update_level_saves_only_on_change(self):
+        user = User.objects.create_user(email='student@example.com', role='student')
+        student = Student.objects.create(user=user, grade=1, cups=10)
+        get_level(0)
+        with self.assertNumQueries(0):
+            student.update_level()
+        student.cups = 60
+        with self.assertNumQueries(1):
+            student.update_level()
+        self.assertEqual(student.level, 2)
+
+    def test_recompute_levels_updates_changed_rows(self):
+        for index, (cups, level) in enumerate([(10, 1), (60, 1), (130, 3), (130, 1)]):
+            user = User.objects.create_user(email=f'student{index}@example.com', role='student')
+            Student.objects.create(user=user, grade=1, cups=cups, level=level)
+
+        self.assertEqual(recompute_levels(Student.objects.all()), 2)
+        self.assertEqual(
+            list(Student.objects.order_by('pk').values_list('level', flat=True)),
+            [1, 2, 3, 3],
+        )
+
+
+class LeaderboardTest(TestCase):
+    def setUp(self):
+        leaderboard.get_store.cache_clear()
+        self.school = School.objects.create(name='School', city='City', email='school@example.com')
+        self.school_class = Class.objects.create(school=self.school, grade=1, section='A')
+        self.students = [
+            self.create_student(index, cups=index * 10) for index in range(15)
+        ]
+
+    def create_student(self, index, cups):
+        user = User.objects.create_user(email=f'student{index}@example.com', role='student')
+        return Student.objects.create(
+            user=user,
+            grade=1,
+            cups=cups,
+            school=self.school,
+            school_class=self.school_class,
+        )
+
+    def test_ranking_returns_top_and_neighbours(self):
+        student = self.students[2]
+        ranking = leaderboard.get_ranking(
+            leaderboard.student_boards(student)['class'], student.pk, student.cups
+        )
+        self.assertEqual([entry['rank'] for entry in ranking], list(range(1, 11)) + [12, 13, 14])
+        self.assertEqual(ranking[0]['id'], self.students[-1].pk)
+        self.assertEqual(ranking[-2], {'id': student.pk, 'rank': 13, 'cups': 20})
+
+    def test_ties_are_ordered_like_redis(self):
+        Student.objects.filter(pk__in=[student.pk for student in self.students]).update(cups=10)
+        student = self.students[0]
+        ranking = leaderboard.get_ranking(
+            leaderboard.student_boards(student)['class'], student.pk, 10
+        )
+        expected = sorted((str(student.pk) for student in self.students), reverse=True)
+        self.assertEqual([str(entry['id']) for entry in ranking[:10]], expected[:10])
+        own_rank = expected.index(str(student.pk)) + 1
+        self.assertIn({'id': student.pk, 'rank': own_rank, 'cups': 10}, ranking)
+
+    def test_board_is_loaded_after_a_single_save(self):
+        # A save before the board was ever loaded, e.g. right after a deploy.
+        student = self.students[0]
+        leaderboard.sync_student(student)
+        ranking = leaderboard.get_ranking(
+            leaderboard.student_boards(student)['class'], student.pk, student.cups
+        )
+        self.assertEqual(ranking[-1], {'id': student.pk, 'rank': 15, 'cups': 0})
+
+    def test_saved_student_moves_between_boards(self):
+        student = self.students[0]
+        board = leaderboard.student_boards(student)['class']
+        leaderboard.get_ranking(board, student.pk, student.cups)
+        other_class = Class.objects.create(school=self.school, grade=1, section='B')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            student.school_class = other_class
+            student.cups = 1000
+            student.save()
+
+        store = leaderboard.get_store()
+        self.assertIsNone(store.rank(leaderboard.board_key(board), str(student.pk)))
+        ranking = leaderboard.get_ranking(
+            leaderboard.student_boards(student)['school'], student.pk, student.cups
+        )
+        self.assertEqual(ranking[0], {'id': student.pk, 'rank': 1, 'cups': 1000})
+
+    def test_rebuild_command_repopulates_boards(self):
+        Student.objects.filter(pk=self.students[0].pk).update(cups=500)
+        call_command('rebuild_leaderboards', stdout=StringIO())
+        store = leaderboard.get_store()
+        board = leaderboard.board_key(leaderboard.student_boards(self.students[0])['global'])
+        self.assertEqual(store.size(board), 15)
+        self.assertEqual(store.rank(board, str(self.students[0].pk)), 0)
+
+    def test_rating_view_includes_rank(self):
+        client = APIClient()
+        student = self.students[0]
+        client.force_authenticate(user=student.user)
+        response = client.get('/api/rating/class/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 12)
+        self.assertEqual(response.data[0]['id'], self.students[-1].pk)
+        self.assertEqual(response.data[-1]['rank'], 15)
+        self.assertEqual(response.data[-1]['id'], student.pk)
+
+
+class WeeklyProgressTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='student@example.com', role='student')
+        Student.objects.create(user=self.user, grade=1)
+        parent_user = User.objects.create_user(email='parent@example.com', role='parent')
+        self.parent = Parent.objects.create(user=parent_user)
+        self.child = Child.objects.create(parent=self.parent, first_name='Child', last_name='Test', grade=1)
+        course = Course.objects.create(name='Math', grade=1, created_by=self.user, language='ru')
+        section = Section.objects.create(course=course, title='Algebra')
+        chapter = Chapter.objects.create(section=section, title='Equations')
+        self.tasks = [
+            Task.objects.create(chapter=chapter, title=f'Task {i}', content_type='task')
+            for i in range(3)
+        ]
+        self.today = timezone.now().date()
+
+    def complete(self, task, days_ago, correct, **learner):
+        completion = TaskCompletion.objects.create(task=task, correct=correct, **learner)
+        completed_at = datetime.combine(self.today - timedelta(days=days_ago), datetime.min.time())
+        TaskCompletion.objects.filter(pk=completion.pk).update(completed_at=completed_at)
+
+    def backfill(self):
+        call_command('backfill_daily_activity', stdout=StringIO())
+
+    def test_migration_backfills_existing_completions(self):
+        self.complete(self.tasks[0], 0, 2, user=self.user)
+        self.complete(self.tasks[1], 0, 1, user=self.user)
+        migration = import_module('tasks.migrations.0006_backfill_dailyactivity')
+        migration.backfill_daily_activity(apps, None)
+
+        activity = DailyActivity.objects.get(user=self.user)
+        self.assertEqual((activity.date, activity.tasks, activity.correct, activity.cups), (self.today, 2, 3, 15))
+
+    def test_admin_edit_updates_the_rollup(self):
+        self.complete(self.tasks[0], 1, 2, user=self.user)
+        self.backfill()
+        completion = TaskCompletion.objects.get()
+        completion.correct, completion.wrong = 1, 1
+        TaskCompletionAdmin(TaskCompletion, admin.site).save_model(None, completion, None, True)
+
+        activity = DailyActivity.objects.get(user=self.user)
+        self.assertEqual((activity.tasks, activity.correct, activity.wrong, activity.cups), (1, 1, 1, 5))
+
+    def test_student_week_is_grouped_by_day(self):
+        self.complete(self.tasks[0], 0, 2, user=self.user)
+        self.complete(self.tasks[1], 0, 1, user=self.user)
+        self.complete(self.tasks[2], 3, 4, user=self.user)
+        self.backfill()
+        self.client.force_authenticate(user=self.user)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/progress/weekly/')
+        progress = response.data['weekly_progress']
+        self.assertEqual(len(progress), 7)
+        self.assertEqual(progress[-1]['date'], self.today)
+        self.assertEqual([entry['cups'] for entry in progress], [0, 0, 0, 20, 0, 0, 15])
+
+    def test_child_month_includes_every_day(self):
+        self.complete(self.tasks[0], 20, 1, child=self.child)
+        self.backfill()
+        self.client.force_authenticate(user=self.parent.user)
+
+        response = self.client.get(f'/api/progress/weekly/?child_id={self.child.pk}&period=month')
+        progress = response.data['weekly_progress']
+        self.assertEqual(len(progress), 30)
+        self.assertEqual(sum(entry['cups'] for entry in progress), 5)
+
+        response = self.client.get(f'/api/progress/weekly/?child_id={self.child.pk}&period=year')
+        self.assertEqual(response.status_code, 400)
+
+    def test_day_totals_in_one_query(self):
+        self.complete(self.tasks[0], 1, 2, user=self.user)
+        self.complete(self.tasks[1], 1, 1, user=self.user)
+        TaskCompletion.objects.filter(task=self.tasks[1]).update(wrong=3)
+        self.backfill()
+        self.client.force_authenticate(user=self.user)
+
+        day = self.today - timedelta(days=1)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/progress/day/?date={day}')
+        self.assertEqual(response.data, {
+            'total_cups': 15,
+            'total_tasks': 2,
+            'total_correct_answers': 3,
+            'total_wrong_answers': 3,
+        })
+
+    def test_range_totals_are_grouped_per_day(self):
+        self.complete(self.tasks[0], 2, 2, child=self.child)
+        self.complete(self.tasks[1], 0, 1, child=self.child)
+        self.backfill()
+        self.client.force_authenticate(user=self.parent.user)
+
+        start = self.today - timedelta(days=2)
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                f'/api/progress/range/?child_id={self.child.pk}&start_date={start}&end_date={self.today}'
+            )
+        progress = response.data['daily_progress']
+        self.assertEqual([entry['date'] for entry in progress], [start + timedelta(days=i) for i in range(3)])
+        self.assertEqual([entry['total_tasks'] for entry in progress], [1, 0, 1])
+        self.assertEqual(progress[0]['total_cups'], 10)
+
+        response = self.client.get(
+            f'/api/progress/range/?child_id={self.child.pk}&start_date={self.today}&end_date={start}'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class CheckStreaksTest(TestCase):
+    LEARNERS = 20000
+
+    def test_resets_inactive_learners_in_constant_queries(self):
+        now = timezone.now()
+        yesterday = now - timedelta(days=1)
+        users = User.objects.bulk_create(
+            User(email=f'streak{i}@example.com', role='student') for i in range(self.LEARNERS)
+        )
+        Student.objects.bulk_create(
+            Student(
+                user=user,
+                grade=1,
+                streak=3,
+                last_task_completed_at=now if i % 4 == 0 else yesterday if i % 4 == 1 else None,
+            )
+            for i, user in enumerate(users)
+        )
+        parent = Parent.objects.create(user=User.objects.create_user(email='parent@example.com', role='parent'))
+        Child.objects.bulk_create(
+            Child(
+                parent=parent,
+                first_name='Child',
+                last_name=str(i),
+                grade=1,
+                streak=2 if i % 2 else 0,
+                last_task_completed_at=now if i % 3 == 0 else yesterday,
+            )
+            for i in range(self.LEARNERS)
+        )
+
+        with self.assertNumQueries(2):
+            reset = check_streaks()
+
+        self.assertEqual(reset, {'students': self.LEARNERS * 3 // 4, 'children': 6667})
+        self.assertEqual(Student.objects.exclude(streak=0).count(), self.LEARNERS // 4)
+        self.assertFalse(Child.objects.exclude(last_task_completed_at=now).exclude(streak=0).exists())
+
+
+class DeleteExpiredSubscriptionsTest(TestCase):
+    def test_deletes_expired_in_chunks(self):
+        plan = Plan.objects.create(duration='monthly', price=1000)
+        now = timezone.now()
+        users = [
+            User.objects.create_user(email=f'subscriber{i}@example.com', role='parent')
+            for i in range(5)
+        ]
+        for i, user in enumerate(users):
+            Subscription.objects.create(
+                user=user,
+                plan=plan,
+                end_date=now - timedelta(days=1) if i < 3 else now + timedelta(days=1),
+            )
+
+        with mock.patch('account.tasks.send_subscription_expired_emails.delay') as delay:
+            result = delete_expired_subscriptions(chunk_size=2)
+
+        self.assertEqual(result, 'Deleted 3 expired subscriptions')
+        self.assertEqual(delay.call_count, 2)
+        notified = [user_id for call in delay.call_args_list for user_id in call.args[0]]
+        self.assertCountEqual(notified, [user.pk for user in users[:3]])
+        self.assertCountEqual(
+            Subscription.objects.values_list('user_id', flat=True), [user.pk for user in users[3:]]
+        )
+
+
+class DailyEmailFanOutTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.students = []
+        for i in range(5):
+            user = User.objects.create_user(email=f'daily{i}@example.com', role='student', is_active=i != 2)
+            self.students.append(Student.objects.create(user=user, grade=1))
+        self.parents = []
+        for i in range(3):
+            user = User.objects.create_user(email=f'parent{i}@example.com', role='parent', is_active=True)
+            self.parents.append(Parent.objects.create(user=user))
+        Child.objects.create(parent=self.parents[0], first_name='A', last_name='Child', grade=1)
+        Child.objects.create(parent=self.parents[2], first_name='B', last_name='Child', grade=1)
+
+    def test_students_are_split_into_id_ranges(self):
+        with mock.patch('account.tasks.chord') as chord:
+            chunks = send_daily_email_to_all_students(chunk_size=2)
+
+        self.assertEqual(chunks, 2)
+        signatures = chord.call_args.args[0]
+        active = [student.pk for student in self.students if student.user.is_active]
+        self.assertEqual(
+            [tuple(signature.args) for signature in signatures],
+            [(active[0], active[1]), (active[2], active[3])],
+        )
+
+    def test_chunk_sends_to_active_students_in_range(self):
+        sent = send_daily_student_emails(self.students[0].pk, self.students[3].pk)
+        self.assertEqual(sent, 3)
+        send_outbox(rate=0)
+        self.assertEqual(
+            [message.to for message in mail.outbox],
+            [['daily0@example.com'], ['daily1@example.com'], ['daily3@example.com']],
+        )
+
+    def test_parents_without_children_are_skipped(self):
+        with mock.patch('account.tasks.chord') as chord:
+            self.assertEqual(send_daily_email_to_all_parents(chunk_size=10), 1)
+        first_id, last_id = chord.call_args.args[0][0].args
+        with self.assertNumQueries(3):
+            sent = send_daily_parent_emails(first_id, last_id)
+        self.assertEqual(sent, 2)
+        send_outbox(rate=0)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox), ['parent0@example.com', 'parent2@example.com']
+        )
+
+
+class EmailOutboxTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        queue_emails(
+            ('Subject', 'Text', '<p>Html</p>', 'from@example.com', [f'to{i}@example.com'])
+            for i in range(3)
+        )
+
+    def test_messages_are_sent_once(self):
+        self.assertEqual(send_outbox(rate=0), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].alternatives[0][0], '<p>Html</p>')
+        self.assertEqual(send_outbox(rate=0), (0, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(OutboxEmail.objects.filter(status=OutboxEmail.SENT).count(), 3)
+        self.assertFalse(OutboxEmail.objects.exclude(body='', html_body='').exists())
+
+    def test_failed_message_is_retried_with_backoff(self):
+        from django.core.mail.backends.locmem import EmailBackend
+
+        send_messages = EmailBackend.send_messages
+
+        def fail_for_second(backend, messages):
+            if messages[0].to == ['to1@example.com']:
+                raise ConnectionError('Connection refused')
+            return send_messages(backend, messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', fail_for_second):
+            self.assertEqual(send_outbox(rate=0), (2, 1))
+
+        failed = OutboxEmail.objects.get(recipients=['to1@example.com'])
+        self.assertEqual((failed.status, failed.attempts), (OutboxEmail.PENDING, 1))
+        self.assertEqual(failed.last_error, 'Connection refused')
+        self.assertGreater(failed.next_attempt_at, timezone.now())
+        self.assertEqual(send_outbox(rate=0), (0, 0))
+
+        OutboxEmail.objects.filter(pk=failed.pk).update(
+            next_attempt_at=timezone.now(), attempts=4
+        )
+        with mock.patch.object(EmailBackend, 'send_messages', fail_for_second):
+            self.assertEqual(send_outbox(rate=0), (0, 1))
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, OutboxEmail.FAILED)
+        self.assertEqual((failed.body, failed.html_body), ('', ''))
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_rate_limit_spaces_messages(self):
+        with (
+            mock.patch('account.outbox.time.time', return_value=100.5),
+            mock.patch('account.outbox.time.sleep') as sleep,
+        ):
+            send_outbox(rate=1)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 1.5])
+
+    def test_workers_share_the_rate_budget(self):
+        # Another worker has already used the budget of the current second.
+        cache.set('email_outbox_rate:100', 1)
+        with (
+            mock.patch('account.outbox.time.time', return_value=100.5),
+            mock.patch('account.outbox.time.sleep') as sleep,
+        ):
+            self.assertEqual(send_outbox(rate=1), (3, 0))
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 1.5, 2.5])
+
+
+class EmailRendererTest(TestCase):
+    def test_text_part_comes_from_text_template(self):
+        renderer = EmailRenderer('daily_email', 'Daily Update')
+        subject, text, html, from_email, recipients = renderer.message(
+            daily_email_context('Ann', 'O\'Neil', 25, 3), 'ann@example.com'
+        )
+        self.assertEqual((subject, recipients), ('Daily Update', ['ann@example.com']))
+        self.assertIn('<strong>25</strong>', html)
+        self.assertIn('O&#x27;Neil', html)
+        self.assertIn('Здравстуйте Ann O\'Neil!', text)
+        self.assertIn('кубков: 25', text)
+        self.assertNotIn('<', text)
+        self.assertNotIn('font-family', text)
+
+
+class MassActivationTest(TestCase):
+    def test_users_are_activated_in_bulk(self):
+        users = [
+            User.objects.create_user(email=f'new{i}@example.com', role='student', is_active=False)
+            for i in range(3)
+        ]
+        with self.assertNumQueries(3):
+            queued = send_mass_activation_email([user.pk for user in users])
+        self.assertEqual(queued, 3)
+
+        send_outbox(rate=0)
+        for user, message in zip(users, sorted(mail.outbox, key=lambda message: message.to)):
+            user.refresh_from_db()
+            self.assertIsNotNone(user.activation_token)
+            self.assertIn(str(user.activation_token), message.body)
+            password = message.body.split('Ваш пароль: ')[1].split()[0]
+            self.assertTrue(user.check_password(password))
+
+    def test_large_batches_are_split_into_chunks(self):
+        with mock.patch('account.tasks.group') as group:
+            send_mass_activation_email(list(range(250)))
+        chunks = [signature.args[0] for signature in group.call_args.args[0]]
+        self.assertEqual([len(chunk) for chunk in chunks], [100, 100, 50])
+
+
+def build_roster_workbook(students):
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['School Name', 'City', 'Email', None])
+    sheet.append(['School 1', 'Astana', 'school1@example.com', None])
+    sheet.append([])
+    sheet.append(['Super', 'Visor', 'supervisor@example.com', '+77001234567'])
+    sheet.append(['Class', 'Language', 'Student Firstname', 'Student Lastname', 'Email', 'Phone(optional)', 'Birthdate'])
+    for row in students:
+        sheet.append(row)
+    content = BytesIO()
+    workbook.save(content)
+    return content.getvalue()
+
+
+def build_roster_csv(students):
+    content = StringIO()
+    writer = csv.writer(content)
+    writer.writerows([
+        ['School Name', 'City', 'Email'],
+        ['School 1', 'Astana', 'school1@example.com'],
+        [],
+        ['Super', 'Visor', 'supervisor@example.com', '+77001234567'],
+        ['Class', 'Language', 'Student Firstname', 'Student Lastname', 'Email', 'Phone(optional)', 'Birthdate'],
+    ])
+    for row in students:
+        writer.writerow([value.date().isoformat() if isinstance(value, datetime) else value for value in row])
+    return content.getvalue().encode('utf-8')
+
+
+ROSTER = [
+    ['1А', 'ru', 'Ann', 'A', 'ann@example.com', None, datetime(2016, 5, 1)],
+    [None, None, 'Bob', 'B', 'bob@example.com', '+77000000000', datetime(2016, 6, 1)],
+    ['2Б', 'kz', None, None, None, None, None],
+    [None, None, 'Cat', 'C', 'cat@example.com', None, None],
+]
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class SchoolImportTest(TestCase):
+    def setUp(self):
+        leaderboard.get_store.cache_clear()
+        self.admin = User.objects.create_superuser(email='admin@example.com', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def test_upload_queues_job(self):
+        upload = SimpleUploadedFile('roster.xlsx', build_roster_workbook(ROSTER))
+        with mock.patch('account.views.import_school.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/schools/upload-excel/', {'file': upload})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.data['job_id']
+        delay.assert_called_once_with(job_id)
+
+        with mock.patch('account.tasks.send_activation_email.delay') as supervisor_email, \
+                mock.patch('account.tasks.send_mass_activation_email.delay') as student_emails:
+            self.assertEqual(import_school(job_id), SchoolImportJob.DONE)
+        supervisor_email.assert_called_once()
+        self.assertEqual(len(student_emails.call_args.args[0]), 3)
+
+        response = self.client.get(f'/api/schools/import-jobs/{job_id}/')
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual(
+            response.data['result'],
+            {'rows': 3, 'classes': 2, 'users': 3, 'students': 3, 'invalid_rows': 0, 'errors': []},
+        )
+
+        school = School.objects.get(name='School 1')
+        self.assertEqual(school.supervisor.email, 'supervisor@example.com')
+        students = {student.user.email: student for student in Student.objects.filter(school=school)}
+        self.assertEqual(str(students['bob@example.com'].school_class), '1А')
+        self.assertEqual(students['cat@example.com'].school_class.language, 'kz')
+        self.assertEqual(students['ann@example.com'].birth_date, datetime(2016, 5, 1).date())
+        self.assertIsNone(students['cat@example.com'].birth_date)
+
+    def test_reimport_skips_existing_rows(self):
+        job = SchoolImportJob.objects.create(file=SimpleUploadedFile('roster.xlsx', build_roster_workbook(ROSTER)))
+        with mock.patch('account.tasks.send_activation_email.delay'), \
+                mock.patch('account.tasks.send_mass_activation_email.delay'):
+            import_school(job.pk)
+            job = SchoolImportJob.objects.create(file=SimpleUploadedFile('roster.xlsx', build_roster_workbook(ROSTER)))
+            import_school(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(
+            job.result,
+            {'rows': 3, 'classes': 0, 'users': 0, 'students': 0, 'invalid_rows': 0, 'errors': []},
+        )
+        self.assertEqual(Student.objects.count(), 3)
+
+    def test_existing_users_are_matched_regardless_of_case(self):
+        existing = User.objects.create_user(
+            email='Ann@example.com', password='password', role='student', is_active=True
+        )
+        job = SchoolImportJob.objects.create(file=SimpleUploadedFile('roster.xlsx', build_roster_workbook(ROSTER)))
+        with mock.patch('account.tasks.send_activation_email.delay'), \
+                mock.patch('account.tasks.send_mass_activation_email.delay'):
+            import_school(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.result['users'], job.result['students']), (2, 3))
+        self.assertEqual(User.objects.filter(email__iexact='ann@example.com').count(), 1)
+        self.assertEqual(existing.student.school.name, 'School 1')
+        self.assertEqual(authenticate(username='ann@example.com', password='password'), existing)
+
+    def test_csv_roster_is_imported_in_chunks(self):
+        content = build_roster_csv(ROSTER)
+        job = SchoolImportJob.objects.create(file=SimpleUploadedFile('roster.csv', content))
+        with mock.patch('account.imports.IMPORT_CHUNK_SIZE', 2), \
+                mock.patch('account.tasks.send_activation_email.delay'), \
+                mock.patch('account.tasks.send_mass_activation_email.delay') as student_emails:
+            self.assertEqual(import_school(job.pk), SchoolImportJob.DONE)
+        self.assertEqual([len(call.args[0]) for call in student_emails.call_args_list], [2, 1])
+        job.refresh_from_db()
+        self.assertEqual(job.result['students'], 3)
+        student = Student.objects.get(user__email='ann@example.com')
+        self.assertEqual(str(student.school_class), '1А')
+        self.assertEqual(student.birth_date, datetime(2016, 5, 1).date())
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        roster = ROSTER + [
+            [None, None, 'Dan', 'D', 'not-an-email', None, None],
+            ['9Б', 'ru', None, None, None, None, None],
+            [None, None, 'Eve', 'E', 'eve@example.com', 'abc', 'yesterday'],
+        ]
+        job = SchoolImportJob.objects.create(file=SimpleUploadedFile('roster.xlsx', build_roster_workbook(roster)))
+        with mock.patch('account.tasks.send_activation_email.delay'), \
+                mock.patch('account.tasks.send_mass_activation_email.delay'):
+            self.assertEqual(import_school(job.pk), SchoolImportJob.DONE)
+        job.refresh_from_db()
+        self.assertEqual(job.result['students'], 3)
+        self.assertEqual(job.result['invalid_rows'], 3)
+        self.assertEqual([error['row'] for error in job.result['errors']], [10, 11, 12])
+        self.assertIn("Invalid email 'not-an-email'", job.result['errors'][0]['errors'])
+        self.assertIn("Invalid class '9Б'", job.result['errors'][1]['errors'])
+        self.assertIn("Invalid birth date 'yesterday'", job.result['errors'][2]['errors'])
+        self.assertFalse(User.objects.filter(email='eve@example.com').exists())
+
+    def test_unsupported_file_type_is_rejected(self):
+        upload = SimpleUploadedFile('roster.xls', b'content')
+        response = self.client.post('/api/schools/upload-excel/', {'file': upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(SchoolImportJob.objects.exists())
+
+    def test_invalid_file_fails_job(self):
+        job = SchoolImportJob.objects.create(file=SimpleUploadedFile('roster.xlsx', b'not a workbook'))
+        self.assertEqual(import_school(job.pk), SchoolImportJob.FAILED)
+        job.refresh_from_db()
+        self.assertTrue(job.error)
+
+
+class ClaimsAuthenticationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='student@example.com', password='password', role='student', is_active=True
+        )
+        self.student = Student.objects.create(user=self.user, grade=1, language='ru')
+        Subscription.objects.create(user=self.user, plan=Plan.objects.create(duration='annual'))
+        course = Course.objects.create(name='Math', grade=1, created_by=self.user, language='ru')
+        section = Section.objects.create(course=course, title='Algebra')
+        chapter = Chapter.objects.create(section=section, title='Equations')
+        task = Task.objects.create(chapter=chapter, title='Task', content_type='task')
+        self.question = Question.objects.create(
+            task=task, title='Question', question_text='2+2?',
+            question_type='multiple_choice_text', options=[], correct_answer=1,
+        )
+        self.tasks_url = f'/api/courses/{course.pk}/sections/{section.pk}/chapters/{chapter.pk}/tasks/'
+
+    def login(self):
+        response = self.client.post('/api/login/', {'email': 'student@example.com', 'password': 'password'})
+        return response.data['access'], response.data['refresh']
+
+    def user_queries(self, url, token, method='get', **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, HTTP_AUTHORIZATION=f'Bearer {token}', **kwargs)
+        return response, [query['sql'] for query in queries if 'FROM "account_user"' in query['sql']]
+
+    def test_login_token_carries_learner_claims(self):
+        access, _ = self.login()
+        token = AccessToken(access)
+        self.assertEqual(token['role'], 'student')
+        self.assertEqual(token['student_id'], self.student.pk)
+
+        user = ClaimsUser(token)
+        self.assertTrue(user.is_student)
+        self.assertEqual(user.student_id, self.student.pk)
+
+    def test_course_list_follows_grade_change(self):
+        Course.objects.create(name='Logic', grade=2, created_by=self.user, language='ru')
+        access, _ = self.login()
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {access}'}
+        self.assertEqual([course['name'] for course in self.client.get('/api/courses/', **headers).data], ['Math'])
+
+        self.student.grade = 2
+        self.student.save()
+        response = self.client.get('/api/courses/', **headers)
+        self.assertEqual([course['name'] for course in response.data], ['Logic'])
+
+    def test_reads_do_not_load_the_user(self):
+        access, _ = self.login()
+        response, user_queries = self.user_queries('/api/courses/', access)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(user_queries, [])
+
+        response, user_queries = self.user_queries(self.tasks_url, access)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(user_queries, [])
+
+    def test_writes_and_old_tokens_load_the_user(self):
+        access, _ = self.login()
+        response, user_queries = self.user_queries(
+            f'{self.tasks_url}{self.question.task_id}/questions/{self.question.pk}/answer/',
+            access, method='post', data={'answer': '1'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(user_queries), 1)
+
+        response, user_queries = self.user_queries('/api/courses/', AccessToken.for_user(self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(user_queries), 1)
+
+    def test_refresh_updates_claims(self):
+        _, refresh = self.login()
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.post('/api/token/refresh/', {'refresh': refresh})
+        self.assertTrue(AccessToken(response.data['access'])['is_staff'])
+
+
+class CurrentUserProfileTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='parent@example.com', password='password', role='parent', is_active=True
+        )
+        self.parent = Parent.objects.create(user=self.user)
+        self.child = Child.objects.create(parent=self.parent, first_name='Child', last_name='Test', grade=1)
+        response = self.client.post('/api/login/', {'email': 'parent@example.com', 'password': 'password'})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        course = Course.objects.create(name='Math', grade=1, created_by=self.user, language='ru')
+        section = Section.objects.create(course=course, title='Algebra')
+        chapter = Chapter.objects.create(section=section, title='Equations')
+        self.task = Task.objects.create(chapter=chapter, title='Task', content_type='task')
+
+    def test_profile_is_served_from_cache(self):
+        response = self.client.get('/api/current-user/')
+        self.assertEqual(response.data['user']['children'][0]['first_name'], 'Child')
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/current-user/')
+        self.assertEqual(cached.data, response.data)
+
+    def test_profile_follows_changes(self):
+        self.client.get('/api/current-user/')
+        Child.objects.create(parent=self.parent, first_name='Second', last_name='Test', grade=2)
+        response = self.client.get('/api/current-user/')
+        self.assertEqual(len(response.data['user']['children']), 2)
+
+        TaskCompletion.objects.create(child=self.child, task=self.task, correct=1)
+        response = self.client.get('/api/current-user/')
+        self.assertEqual(response.data['user']['children'][0]['tasks_completed'], 1)
+
+        Subscription.objects.create(user=self.user, plan=Plan.objects.create(duration='annual'))
+        response = self.client.get('/api/current-user/')
+        self.assertTrue(response.data['user']['has_subscription'])
+
+    def test_streak_reset_invalidates_every_profile(self):
+        Child.objects.filter(pk=self.child.pk).update(streak=3)
+        self.client.get('/api/current-user/')
+        check_streaks()
+        response = self.client.get('/api/current-user/')
+        self.assertEqual(response.data['user']['children'][0]['streak'], 0)
+
+    def test_profile_is_not_kept_past_its_expiry(self):
+        build = mock.Mock(return_value=({'user': {}}, timezone.now() - timedelta(seconds=1)))
+        get_profile(self.user.pk, build)
+        get_profile(self.user.pk, build)
+        self.assertEqual(build.call_count, 2)
+
+
+class ChildProfileTest(TestCase):
+    def setUp(self):
+        leaderboard.get_store.cache_clear()
+        course = Course.objects.create(
+            name='Math', grade=1, created_by=User.objects.create_user(email='author@example.com'), language='ru'
+        )
+        chapter = Chapter.objects.create(section=Section.objects.create(course=course, title='Algebra'), title='Equations')
+        self.tasks = [Task.objects.create(chapter=chapter, title=f'Task {i}', content_type='task') for i in range(2)]
+        annual = Plan.objects.create(duration='annual')
+        self.children = []
+        for i in range(10):
+            user = User.objects.create_user(email=f'parent{i}@example.com', role='parent')
+            if i % 2:
+                Subscription.objects.create(user=user, plan=annual)
+            parent = Parent.objects.create(user=user)
+            child = Child.objects.create(parent=parent, first_name=f'Child {i}', last_name='T', grade=1, cups=i)
+            for task in self.tasks[: i % 3]:
+                TaskCompletion.objects.create(child=child, task=task, correct=1)
+            self.children.append(child)
+
+    def test_serializing_children_takes_one_query(self):
+        with self.assertNumQueries(1):
+            data = ChildSerializer(Child.objects.with_profile().order_by('pk'), many=True).data
+        for child, item in zip(self.children, data):
+            self.assertEqual(item['tasks_completed'], child.completed_tasks.count())
+            self.assertEqual(item['has_subscription'], hasattr(child.parent.user, 'subscription'))
+            self.assertFalse(item['is_free_trial'])
+            self.assertEqual(item['email'], child.parent.user.email)
+
+    def test_child_leaderboard_query_count_does_not_grow(self):
+        client = APIClient()
+        parent = self.children[0].parent
+        client.force_authenticate(user=parent.user)
+        client.get(f'/api/rating/global/?child_id={self.children[0].pk}')
+        with self.assertNumQueries(2):
+            response = client.get(f'/api/rating/global/?child_id={self.children[0].pk}')
+        self.assertEqual(len(response.data), 10)
+        self.assertEqual(response.data[0]['first_name'], 'Child 9')
+        self.assertEqual(response.data[0]['rank'], 1)
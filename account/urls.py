@@ -51,4 +51,7 @@ urlpatterns = [
     path("all-students/", AllStudentsView.as_view(), name="all-students"),
     path("progress/weekly/", WeeklyProgressAPIView.as_view(), name="weekly-progress"),
     path("progress/day/", ProgressForSpecificDay.as_view(), name="daily-progress"),
+    path(
+        "progress/range/", ProgressForDateRange.as_view(), name="date-range-progress"
+    ),
 ]
@@ -1,17 +1,40 @@
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
 import secrets
 
-def render_email(first_name, last_name, current_cups, level):
-    context = {
-        'first_name': first_name,
-        'last_name': last_name,
-        'current_cups': current_cups,
-        'level': level
+from django.conf import settings
+from django.template.loader import get_template
+
+
+class EmailRenderer:
+    """
+    Render one email for many recipients.
+
+    The ``<name>.html`` and ``<name>.txt`` templates are loaded once, and the
+    plain-text part is rendered from its own template rather than by
+    stripping tags from the HTML.
+    """
+
+    def __init__(self, name, subject, from_email=None):
+        self.subject = subject
+        self.from_email = from_email or settings.DEFAULT_FROM_EMAIL
+        self.html_template = get_template(f"{name}.html")
+        self.text_template = get_template(f"{name}.txt")
+
+    def render(self, context):
+        return self.html_template.render(context), self.text_template.render(context)
+
+    def message(self, context, recipient):
+        """Return a ``send_mass_html_mail`` tuple for one recipient."""
+        html_content, text_content = self.render(context)
+        return (self.subject, text_content, html_content, self.from_email, [recipient])
+
+
+def daily_email_context(first_name, last_name, current_cups, level):
+    return {
+        "first_name": first_name,
+        "last_name": last_name,
+        "current_cups": current_cups,
+        "level": level,
     }
-    html_content = render_to_string('daily_email.html', context)
-    text_content = strip_tags(html_content)
-    return html_content, text_content
 
 
 def generate_password():
@@ -1,7 +1,7 @@
-from datetime import timedelta, datetime
+from datetime import timedelta
 import uuid
-from django.conf import settings
-import pandas as pd
+from functools import partial
+from django.db import transaction
 from django.utils import timezone
 from rest_framework import status, viewsets
 from rest_framework.response import Response
@@ -12,7 +12,6 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import authenticate
 from django.utils.dateparse import parse_date
-from django.db.models import Sum
 from account.serializers import (
     ClassSerializer,
     UserSerializer,
@@ -27,18 +26,42 @@ from account.serializers import (
     ChildSerializer,
     SimpleStudentSerializer,
     MyTokenObtainPairSerializer,
+    SchoolImportJobSerializer,
 )
-from account.models import User, Parent, Child, Student, School, Class
+from account.models import (
+    User,
+    Parent,
+    Child,
+    Student,
+    School,
+    Class,
+    SchoolImportJob,
+)
+from account import leaderboard
+from account.authentication import ClaimsJWTAuthentication
 from account.permissions import IsSuperUser, IsParent, IsStudent, IsSupervisor
+from account.profiles import get_profile
 from subscription.models import Plan, Subscription
-from tasks.models import TaskCompletion
+from tasks.progress import (
+    PROGRESS_PERIODS,
+    LearnerProgress,
+    daily_cups,
+    daily_totals,
+    day_totals,
+    format_daily_cups,
+    get_period_range,
+)
 from .tasks import (
+    import_school,
     send_activation_email,
     send_mass_activation_email,
     send_password_reset_request_email,
 )
 from .utils import generate_password
 
+INVALID_PERIOD_MESSAGE = "Invalid period. Use 'week', 'month' or 'term'."
+ROSTER_EXTENSIONS = (".xlsx", ".csv")
+
 
 class ActivateAccount(APIView):
 
@@ -250,100 +273,29 @@ class SchoolViewSet(viewsets.ModelViewSet):
             return Response(
                 {"message": "No file was uploaded"}, status=status.HTTP_400_BAD_REQUEST
             )
+        if not file.name.lower().endswith(ROSTER_EXTENSIONS):
+            return Response(
+                {"message": "Only .xlsx and .csv files are supported"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        self.process_excel(file)
+        job = SchoolImportJob.objects.create(file=file, created_by=request.user)
+        transaction.on_commit(partial(import_school.delay, job.pk))
         return Response(
-            {"message": "Excel file has been processed successfully"},
-            status=status.HTTP_200_OK,
+            {"message": "Excel file has been queued for processing", "job_id": job.pk},
+            status=status.HTTP_202_ACCEPTED,
         )
 
-    def process_excel(self, excel_file):
-        df = pd.read_excel(excel_file, engine="openpyxl")
-        school_name = df.iloc[0]["School Name"]
-        city = df.iloc[0]["City"]
-        school_email = df.iloc[0]["Email"]
-
-        school, created = School.objects.get_or_create(
-            name=school_name, defaults={"city": city, "email": school_email}
-        )
-
-        # Extract the supervisor information
-        supervisor_first_name = df.iloc[2]["School Name"]
-        supervisor_last_name = df.iloc[2]["City"]
-        supervisor_email = df.iloc[2]["Email"]
-        supervisor_phone = df.iloc[2]["Unnamed: 3"]
-
-        supervisor, created = User.objects.get_or_create(
-            email=supervisor_email,
-            defaults={
-                "first_name": supervisor_first_name,
-                "last_name": supervisor_last_name,
-                "role": "supervisor",
-                "is_active": False,
-                "phone_number": supervisor_phone if pd.notna(supervisor_phone) else "",
-            },
-        )
-        if created:
-            supervisor.activation_token = uuid.uuid4()
-            password = generate_password()
-            supervisor.set_password(password)
-            supervisor.save()
-            send_activation_email.delay(supervisor.pk, password)
-
-        school.supervisor = supervisor
-        school.save()
-
-        # Extract the class and student information
-        df_students = pd.read_excel(excel_file, engine="openpyxl", skiprows=4)
-        new_user_ids = []
-        for idx, row in df_students.iterrows():
-            if pd.notna(row["Class"]):
-                class_info = row["Class"]
-                grade = int("".join(filter(str.isdigit, class_info)))
-                section = "".join(filter(str.isalpha, class_info))
-                language = row["Language"]
-
-                school_class, created = Class.objects.get_or_create(
-                    school=school,
-                    grade=grade,
-                    section=section,
-                    defaults={"language": language},
-                )
-
-            if pd.notna(row["Student Firstname"]):
-                student_first_name = row["Student Firstname"]
-                student_last_name = row["Student Lastname"]
-                student_email = row["Email"]
-                student_phone = row["Phone(optional)"]
-                birth_date = row["Birthdate"]
-
-                user, created = User.objects.get_or_create(
-                    email=student_email,
-                    defaults={
-                        "first_name": student_first_name,
-                        "last_name": student_last_name,
-                        "role": "student",
-                        "is_active": False,
-                        "phone_number": (
-                            student_phone if pd.notna(student_phone) else ""
-                        ),
-                    },
-                )
-                if created:
-                    user.activation_token = uuid.uuid4()
-                    user.save()
-                    new_user_ids.append(user.pk)
-
-                Student.objects.get_or_create(
-                    user=user,
-                    school_class=school_class,
-                    school=school,
-                    grade=grade,
-                    defaults={"language": language, "birth_date": birth_date},
-                )
-
-        if new_user_ids:
-            send_mass_activation_email.delay(new_user_ids)
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="import-jobs/(?P<job_pk>[^/.]+)",
+        url_name="import-job",
+        permission_classes=[IsSuperUser],
+    )
+    def import_job(self, request, job_pk=None):
+        job = get_object_or_404(SchoolImportJob, pk=job_pk)
+        return Response(SchoolImportJobSerializer(job).data, status=status.HTTP_200_OK)
 
 
 class SupervisorSchoolViewset(viewsets.ReadOnlyModelViewSet):
@@ -402,40 +354,17 @@ class SupervisorSchoolViewset(viewsets.ReadOnlyModelViewSet):
             Student, pk=student_pk, school__supervisor=request.user
         )
 
-        today = timezone.now().date()
-        start_date = today - timedelta(days=6)
-
-        task_completions = TaskCompletion.objects.filter(
-            user=student.user,
-            completed_at__date__gte=start_date,
-            completed_at__date__lte=today,
-        )
-        daily_progress = {str(start_date + timedelta(days=i)): 0 for i in range(7)}
-
-        for task_completion in task_completions:
-            day = str(task_completion.completed_at.date())
-            if day in daily_progress:
-                correct_questions_number = task_completion.correct
-                daily_progress[day] += (
-                    correct_questions_number * settings.QUESTION_REWARD
-                )
-
-        date_to_day = {
-            (start_date + timedelta(days=i)): (start_date + timedelta(days=i)).strftime(
-                "%A"
+        period = request.query_params.get("period", "week")
+        if period not in PROGRESS_PERIODS:
+            return Response(
+                {"message": INVALID_PERIOD_MESSAGE},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-            for i in range(7)
-        }
 
-        response_data = {
-            "weekly_progress": [
-                {
-                    "day": date_to_day[datetime.strptime(date, "%Y-%m-%d").date()],
-                    "cups": cups,
-                }
-                for date, cups in daily_progress.items()
-            ]
-        }
+        start_date, end_date = get_period_range(period)
+        response_data = format_daily_cups(
+            daily_cups(start_date, end_date, user=student.user)
+        )
 
         return Response(response_data, status=status.HTTP_200_OK)
 
@@ -520,14 +449,28 @@ class ChildrenViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         if self.request.user.is_parent:
             parent = self.request.user.parent
-            return Child.objects.filter(parent=parent)
+            return Child.objects.filter(parent=parent).with_profile()
         if self.request.user.is_superuser:
-            return Child.objects.all()
+            return Child.objects.with_profile()
 
 
 class TopStudentsView(APIView):
+    """
+    Rating of the requesting student, or of a parent's ``child_id``.
+
+    Returns the top ten learners of the board, and when the requester is
+    ranked below them also the requester with one neighbour on each side (up
+    to 13 entries). Every entry carries its 1-based ``rank``.
+    """
+
     permission_classes = [IsParent | IsStudent]
 
+    STUDENT_BOARD_ERRORS = {
+        "class": "Student is not assigned to any class.",
+        "school": "Student is not assigned to any school.",
+        "global": "Student grade is not set.",
+    }
+
     def get(self, request, rating_type):
         user = request.user
         child_id = request.query_params.get("child_id", None)
@@ -546,95 +489,70 @@ class TopStudentsView(APIView):
 
     def _get_top_students_for_student(self, user, rating_type, request):
         current_student = user.student
-        top_students = []
-
-        if rating_type == "class":
-            if current_student.school_class is not None:
-                top_students = Student.objects.filter(
-                    school_class=current_student.school_class
-                ).order_by("-cups")[:10]
-            else:
-                return Response(
-                    {"detail": "Student is not assigned to any class."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-        elif rating_type == "school":
-            if current_student.school is not None:
-                top_students = Student.objects.filter(
-                    school=current_student.school
-                ).order_by("-cups")[:10]
-            else:
-                return Response(
-                    {"detail": "Student is not assigned to any school."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-        elif rating_type == "global":
-            if current_student.grade is not None:
-                top_students = Student.objects.filter(
-                    grade=current_student.grade
-                ).order_by("-cups")[:10]
-            else:
-                return Response(
-                    {"detail": "Student grade is not set."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-        else:
+        boards = leaderboard.student_boards(current_student)
+
+        if rating_type not in boards:
             return Response(
                 {"detail": "Invalid rating type. Use 'class', 'school', or 'global'."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        if boards[rating_type] is None:
+            return Response(
+                {"detail": self.STUDENT_BOARD_ERRORS[rating_type]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        top_students = self._ensure_current_student_in_top_students(
-            current_student, top_students
+        ranking = leaderboard.get_ranking(
+            boards[rating_type], current_student.pk, current_student.cups
         )
-        serializer = SimpleStudentSerializer(
-            top_students, many=True, context={"request": request}
+        return self._ranked_response(
+            ranking,
+            Student.objects.select_related("user"),
+            SimpleStudentSerializer,
+            request,
         )
-        return Response(serializer.data, status=status.HTTP_200_OK)
 
     def _get_top_students_for_child(self, user, child_id, rating_type, request):
         current_child = get_object_or_404(Child, parent=user.parent, pk=child_id)
-        top_children = []
-
-        if rating_type in ["class", "school", "global"]:
-            if current_child.grade is not None:
-                top_children = Child.objects.filter(grade=current_child.grade).order_by(
-                    "-cups"
-                )[:10]
-            else:
-                return Response(
-                    {"detail": "Child is not assigned to any grade."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-        else:
+        boards = leaderboard.child_boards(current_child)
+
+        if rating_type not in boards:
             return Response(
                 {"detail": "Invalid rating type. Use 'global'."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        if boards[rating_type] is None:
+            return Response(
+                {"detail": "Child is not assigned to any grade."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        top_children = self._ensure_current_child_in_top_children(
-            current_child, top_children
+        ranking = leaderboard.get_ranking(
+            boards[rating_type], current_child.pk, current_child.cups
         )
-        serializer = ChildSerializer(
-            top_children, many=True, context={"request": request}
+        return self._ranked_response(
+            ranking,
+            Child.objects.with_profile(),
+            ChildSerializer,
+            request,
         )
-        return Response(serializer.data, status=status.HTTP_200_OK)
 
-    def _ensure_current_student_in_top_students(self, current_student, top_students):
-        if current_student not in top_students:
-            top_students = list(top_students)
-            top_students.append(current_student)
-            top_students.sort(key=lambda student: student.cups, reverse=True)
-            top_students = top_students[:10]
-        return top_students
-
-    def _ensure_current_child_in_top_children(self, current_child, top_children):
-        if current_child not in top_children:
-            top_children = list(top_children)
-            top_children.append(current_child)
-            top_children.sort(key=lambda child: child.cups, reverse=True)
-            top_children = top_children[:10]
-        return top_children
+    def _ranked_response(self, ranking, queryset, serializer_class, request):
+        learners = queryset.in_bulk([entry["id"] for entry in ranking])
+        ranked = [
+            (learners[entry["id"]], entry["rank"])
+            for entry in ranking
+            if entry["id"] in learners
+        ]
+        serializer = serializer_class(
+            [learner for learner, _ in ranked],
+            many=True,
+            context={"request": request},
+        )
+        data = serializer.data
+        for item, (_, rank) in zip(data, ranked):
+            item["rank"] = rank
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class WeeklyProgressAPIView(APIView):
@@ -643,65 +561,27 @@ class WeeklyProgressAPIView(APIView):
     def get(self, request):
         user = request.user
         child_id = request.query_params.get("child_id", None)
+        period = request.query_params.get("period", "week")
 
-        today = timezone.now().date()
-        start_date = today - timedelta(days=6)
-
-        task_completions = self._get_task_completions(user, child_id, start_date, today)
-        if task_completions is None:
+        if period not in PROGRESS_PERIODS:
             return Response(
-                {"message": "Invalid request. Parent must provide child_id."},
+                {"message": INVALID_PERIOD_MESSAGE},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        start_date, end_date = get_period_range(period)
 
-        daily_progress = self._calculate_daily_progress(task_completions, start_date)
-        response_data = self._format_weekly_progress_response(
-            daily_progress, start_date
-        )
-
-        return Response(response_data, status=status.HTTP_200_OK)
-
-    def _get_task_completions(self, user, child_id, start_date, today):
         if user.is_student:
-            return TaskCompletion.objects.filter(
-                user=user,
-                completed_at__date__gte=start_date,
-                completed_at__date__lte=today,
-            )
+            progress = daily_cups(start_date, end_date, user=user)
         elif user.is_parent and child_id:
             child = get_object_or_404(Child, pk=child_id, parent=user.parent)
-            return TaskCompletion.objects.filter(
-                child=child,
-                completed_at__date__gte=start_date,
-                completed_at__date__lte=today,
+            progress = daily_cups(start_date, end_date, child=child)
+        else:
+            return Response(
+                {"message": "Invalid request. Parent must provide child_id."},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-        return None
-
-    def _calculate_daily_progress(self, task_completions, start_date):
-        daily_progress = {str(start_date + timedelta(days=i)): 0 for i in range(7)}
 
-        for task_completion in task_completions:
-            day = str(task_completion.completed_at.date())
-            if day in daily_progress:
-                daily_progress[day] += (
-                    task_completion.correct * settings.QUESTION_REWARD
-                )
-
-        return daily_progress
-
-    def _format_weekly_progress_response(self, daily_progress, start_date):
-        date_to_day = {
-            str(start_date + timedelta(days=i)): (
-                start_date + timedelta(days=i)
-            ).strftime("%A")
-            for i in range(7)
-        }
-        return {
-            "weekly_progress": [
-                {"day": date_to_day[date], "cups": cups}
-                for date, cups in daily_progress.items()
-            ]
-        }
+        return Response(format_daily_cups(progress), status=status.HTTP_200_OK)
 
 
 class AllStudentsView(APIView):
@@ -736,44 +616,50 @@ class ProgressForSpecificDay(APIView):
                 {"message": "Invalid date format"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        if user.is_student:
-            task_completions = TaskCompletion.objects.filter(
-                completed_at__date=date, user=user
+        progress = LearnerProgress.from_request(request)
+        if not progress.is_learner:
+            return Response(
+                {"message": "Invalid request parameters"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-        elif user.is_parent and child_id:
-            child = get_object_or_404(Child, pk=child_id, parent=user.parent)
-            task_completions = TaskCompletion.objects.filter(
-                completed_at__date=date, child=child
+
+        return Response(
+            day_totals(date, **progress.learner_filter), status=status.HTTP_200_OK
+        )
+
+
+class ProgressForDateRange(APIView):
+    MAX_DAYS = 366
+
+    def get(self, request, *args, **kwargs):
+        start_date = parse_date(request.query_params.get("start_date") or "")
+        end_date = parse_date(request.query_params.get("end_date") or "")
+        if not start_date or not end_date or start_date > end_date:
+            return Response(
+                {"message": "Provide a valid start_date and end_date"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-        else:
+        if (end_date - start_date).days >= self.MAX_DAYS:
+            return Response(
+                {"message": f"The range cannot exceed {self.MAX_DAYS} days"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        progress = LearnerProgress.from_request(request)
+        if not progress.is_learner:
             return Response(
                 {"message": "Invalid request parameters"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        total_cups = (
-            task_completions.aggregate(total_cups=Sum("correct"))["total_cups"] or 0
-        )
-        total_correct_answers = (
-            task_completions.aggregate(total_correct_answers=Sum("correct"))[
-                "total_correct_answers"
-            ]
-            or 0
-        )
-        total_wrong_answers = (
-            task_completions.aggregate(total_wrong_answers=Sum("wrong"))[
-                "total_wrong_answers"
-            ]
-            or 0
+        return Response(
+            {
+                "daily_progress": daily_totals(
+                    start_date, end_date, **progress.learner_filter
+                )
+            },
+            status=status.HTTP_200_OK,
         )
-        total_cups *= settings.QUESTION_REWARD
-        response_dict = {
-            "total_cups": total_cups,
-            "total_tasks": task_completions.count(),
-            "total_correct_answers": total_correct_answers,
-            "total_wrong_answers": total_wrong_answers,
-        }
-        return Response(response_dict, status=status.HTTP_200_OK)
 
 
 class MyTokenObtainPairView(TokenObtainPairView):
@@ -781,13 +667,15 @@ class MyTokenObtainPairView(TokenObtainPairView):
 
 
 class CurrentUserView(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        data = self._get_user_data(request.user)
+        data = get_profile(request.user.pk, partial(self._get_user_data, request.user))
         return Response(data)
 
     def _get_user_data(self, user):
+        """Return the profile of ``user`` and when it expires on its own."""
         data = {}
         has_subscription = hasattr(user, "subscription")
         active_subscription = user.subscription if has_subscription else None
@@ -810,10 +698,11 @@ class CurrentUserView(APIView):
             data["user"] = self._get_supervisor_data(user)
         else:
             data["user"] = self._get_superadmin_data(user)
-        return data
+        expires_at = active_subscription.end_date if subscription_active else None
+        return data, expires_at
 
     def _get_student_data(self, user, subscription_active, is_free_trial):
-        student = Student.objects.get(user=user)
+        student = Student.objects.get(user_id=user.pk)
         tasks_completed = user.completed_tasks.count()
         return {
             "id": user.id,
@@ -837,7 +726,7 @@ class CurrentUserView(APIView):
 
     def _get_parent_data(self, user, subscription_active, is_free_trial):
         parent = user.parent
-        children = Child.objects.filter(parent=parent)
+        children = Child.objects.filter(parent=parent).with_profile()
         return {
             "id": user.id,
             "email": user.email,
@@ -1,3 +1,228 @@
-from django.test import TestCase
+from datetime import datetime
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from account.models import Child, LevelRequirement, Parent, Student, User
+from olympiad.models import Olympiad
+from subscription.models import Plan, Subscription
+from tasks.models import Chapter, Course, Question, Section, Task, TaskCompletion
+from vunderkids.caching import get_cache_stats
+from vunderkids.middleware import SlidingWindowLimiter, parse_rate
+
+RATE_LIMIT_GROUPS = [
+    {'name': 'auth', 'pattern': r'^/api/login/', 'anon': '2/minute', 'user': '2/minute'},
+    {'name': 'default', 'pattern': r'', 'anon': '3/minute', 'user': '5/minute'},
+]
+
+
+class SlidingWindowLimiterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.limiter = SlidingWindowLimiter(cache)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('100/minute'), (100, 60))
+        self.assertEqual(parse_rate('5/s'), (5, 1))
+        self.assertEqual(parse_rate('1000/day'), (1000, 86400))
+
+    def test_requests_over_the_limit_are_rejected(self):
+        for _ in range(3):
+            self.assertIsNone(self.limiter.hit('client', 3, 60, now=600))
+        self.assertEqual(self.limiter.hit('client', 3, 60, now=615), 45)
+        self.assertIsNone(self.limiter.hit('other', 3, 60, now=615))
+
+    def test_previous_window_is_weighed_by_its_overlap(self):
+        for _ in range(4):
+            self.limiter.hit('client', 4, 60, now=600)
+        # A quarter into the next window three quarters of the previous
+        # requests still count, so one more request fits.
+        self.assertIsNone(self.limiter.hit('client', 4, 60, now=675))
+        self.assertEqual(self.limiter.hit('client', 4, 60, now=675), 1)
+        self.assertIsNone(self.limiter.hit('client', 4, 60, now=676))
+        self.assertEqual(self.limiter.hit('client', 4, 60, now=676), 14)
+
+    def test_rejected_requests_are_not_counted(self):
+        for _ in range(10):
+            self.limiter.hit('client', 2, 60, now=600)
+        self.assertIsNone(self.limiter.hit('client', 2, 60, now=720))
+
+
+@override_settings(RATE_LIMIT_GROUPS=RATE_LIMIT_GROUPS)
+class RateLimitMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_requests_are_limited_per_ip(self):
+        for _ in range(3):
+            self.assertNotEqual(self.client.get('/api/courses/').status_code, 429)
+        response = self.client.get('/api/courses/')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+
+        response = self.client.get('/api/courses/', REMOTE_ADDR='10.0.0.2')
+        self.assertNotEqual(response.status_code, 429)
+
+    def test_route_groups_have_separate_limits(self):
+        for _ in range(2):
+            self.client.post('/api/login/', {})
+        self.assertEqual(self.client.post('/api/login/', {}).status_code, 429)
+        self.assertNotEqual(self.client.get('/api/courses/').status_code, 429)
+
+    def test_authenticated_requests_are_limited_per_user(self):
+        user = User.objects.create_user(email='user@example.com', password='password')
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+        for index in range(5):
+            response = self.client.get('/api/courses/', REMOTE_ADDR=f'10.0.0.{index}', **headers)
+            self.assertNotEqual(response.status_code, 429)
+        self.assertEqual(self.client.get('/api/courses/', **headers).status_code, 429)
+        # The user's requests did not use up the anonymous limit of the IP.
+        self.assertNotEqual(self.client.get('/api/courses/').status_code, 429)
+
+    def test_requests_pass_when_cache_is_unavailable(self):
+        with mock.patch.object(SlidingWindowLimiter, 'hit', side_effect=ConnectionError):
+            for _ in range(5):
+                self.assertNotEqual(self.client.get('/api/courses/').status_code, 429)
+
+    def test_invalid_token_is_limited_per_ip(self):
+        headers = {'HTTP_AUTHORIZATION': 'Bearer not-a-token'}
+        for _ in range(3):
+            self.client.get('/api/courses/', **headers)
+        self.assertEqual(self.client.get('/api/courses/', **headers).status_code, 429)
+
+
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='student@example.com', role='student')
+        self.student = Student.objects.create(user=self.user, grade=1, language='ru')
+
+    def test_plans_are_served_from_cache_until_changed(self):
+        plan = Plan.objects.create(duration='monthly', price=1000)
+        self.client.get('/api/plans/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/plans/')
+        self.assertEqual(response.data[0]['price'], '1000')
+
+        plan.price = 1500
+        plan.save()
+        response = self.client.get('/api/plans/')
+        self.assertEqual(response.data[0]['price'], '1500')
+
+    def test_olympiads_are_cached_per_learner(self):
+        Olympiad.objects.create(
+            name='Math', description='', price=0, grade=1, language='ru',
+            start_date=datetime(2024, 1, 1), end_date=datetime(2024, 2, 1),
+        )
+        Olympiad.objects.create(
+            name='Logic', description='', price=0, grade=2, language='ru',
+            start_date=datetime(2024, 1, 1), end_date=datetime(2024, 2, 1),
+        )
+        self.client.force_authenticate(user=self.user)
+        self.client.get('/api/olympiads/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/olympiads/')
+        self.assertEqual([olympiad['name'] for olympiad in response.data], ['Math'])
+
+        parent_user = User.objects.create_user(email='parent@example.com', role='parent')
+        child = Child.objects.create(
+            parent=Parent.objects.create(user=parent_user), first_name='C', last_name='T', grade=2,
+        )
+        self.client.force_authenticate(user=parent_user)
+        response = self.client.get(f'/api/olympiads/?child_id={child.pk}')
+        self.assertEqual([olympiad['name'] for olympiad in response.data], ['Logic'])
+
+        # Moving the student to another grade invalidates their cached list.
+        self.student.grade = 2
+        self.student.save()
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/olympiads/')
+        self.assertEqual([olympiad['name'] for olympiad in response.data], ['Logic'])
+
+    def test_course_catalog_follows_progress_and_content(self):
+        course = Course.objects.create(name='Math', grade=1, created_by=self.user, language='ru')
+        section = Section.objects.create(course=course, title='Algebra')
+        chapter = Chapter.objects.create(section=section, title='Equations')
+        task = Task.objects.create(chapter=chapter, title='Task', content_type='task')
+        self.client.force_authenticate(user=self.user)
+
+        self.client.get('/api/courses/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/courses/')
+        self.assertEqual(response.data[0]['completed_tasks'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TaskCompletion.objects.create(user=self.user, task=task, correct=1)
+        response = self.client.get('/api/courses/')
+        self.assertEqual(response.data[0]['completed_tasks'], 1)
+
+        Task.objects.create(chapter=chapter, title='Task 2', content_type='task')
+        response = self.client.get('/api/courses/')
+        self.assertEqual(response.data[0]['total_tasks'], 2)
+
+    def test_stats_count_hits_and_misses(self):
+        Plan.objects.create(duration='monthly', price=1000)
+        for _ in range(3):
+            self.client.get('/api/plans/')
+        admin = User.objects.create_superuser(email='admin@example.com', password='password')
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/cache-stats/')
+        self.assertEqual(
+            response.data['PlanViewSet.list'], {'hits': 2, 'misses': 1, 'hit_rate': 2 / 3}
+        )
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get('/api/cache-stats/').status_code, 403)
+
+
+# The production cache settings pointed at a Redis server that is not running.
+UNREACHABLE_CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:1/0',
+        'OPTIONS': {'IGNORE_EXCEPTIONS': True, 'SOCKET_CONNECT_TIMEOUT': 1},
+    }
+}
+
+
+@override_settings(CACHES=UNREACHABLE_CACHES, DJANGO_REDIS_LOG_IGNORED_EXCEPTIONS=False)
+class CacheOutageTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='student@example.com', role='student')
+        self.student = Student.objects.create(user=self.user, grade=1, language='ru')
+        Subscription.objects.create(user=self.user, plan=Plan.objects.create(duration='annual'))
+        LevelRequirement.objects.create(level=1, cups_required=0)
+        LevelRequirement.objects.create(level=2, cups_required=5)
+        course = Course.objects.create(name='Math', grade=1, created_by=self.user, language='ru')
+        section = Section.objects.create(course=course, title='Algebra')
+        chapter = Chapter.objects.create(section=section, title='Equations')
+        self.task = Task.objects.create(chapter=chapter, title='Task', content_type='task')
+        self.question = Question.objects.create(
+            task=self.task, title='Question', question_text='2+2?',
+            question_type='multiple_choice_text', options=[], correct_answer=1,
+        )
+        self.tasks_url = f'/api/courses/{course.pk}/sections/{section.pk}/chapters/{chapter.pk}/tasks/'
+        self.client.force_authenticate(user=self.user)
+
+    def test_reads_are_served_from_the_database(self):
+        response = self.client.get('/api/courses/')
+        self.assertEqual([course['name'] for course in response.data], ['Math'])
+        response = self.client.get(f'/api/courses/{self.task.chapter.section.course_id}/sections/')
+        self.assertEqual(response.data[0]['total_tasks'], 1)
+        response = self.client.get('/api/current-user/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['grade'], 1)
+
+    def test_answers_are_submitted(self):
+        response = self.client.post(
+            f'{self.tasks_url}{self.task.pk}/questions/{self.question.pk}/answer/',
+            {'answer': '1'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.student.refresh_from_db()
+        self.assertEqual((self.student.cups, self.student.level), (5, 2))
@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from .views import CacheStatsView
+
 urlpatterns = [
+    path("cache-stats/", CacheStatsView.as_view(), name="cache-stats"),
     path("", include("account.urls")),
     path("", include("tasks.urls")),
     path("", include("subscription.urls")),
@@ -1,3 +1,13 @@
-from django.shortcuts import render
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from account.permissions import IsSuperUser
+from vunderkids.caching import get_cache_stats
+
+
+class CacheStatsView(APIView):
+    permission_classes = [IsSuperUser]
+
+    def get(self, request):
+        return Response(get_cache_stats(), status=status.HTTP_200_OK)
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from vunderkids.caching import bump_version
+from .models import Olympiad
+
+
+@receiver(post_save, sender=Olympiad)
+@receiver(post_delete, sender=Olympiad)
+def invalidate_olympiads(sender, **kwargs):
+    bump_version("olympiads")
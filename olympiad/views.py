@@ -7,6 +7,7 @@ from olympiad.models import Olympiad
 from rest_framework.response import Response
 
 from olympiad.serializers import OlympiadSerializer
+from vunderkids.caching import cache_response
 
 
 # Create your views here.
@@ -15,6 +16,7 @@ class OlympiadViewSet(viewsets.ModelViewSet):
     serializer_class = OlympiadSerializer
     permission_classes = [IsSuperUserOrStaffOrReadOnly]
 
+    @cache_response("olympiads", per_learner=True)
     def list(self, request):
         user = request.user
         child_id = request.query_params.get("child_id", None)
@@ -0,0 +1,49 @@
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+SUBSCRIPTION_STATUS_TIMEOUT = 60 * 60 * 24
+
+
+def _status_key(user_id):
+    return f"subscription_status:{user_id}"
+
+
+def get_subscription_status(user_id):
+    """
+    Return the cached ``{"plan", "end_date"}`` of a user's subscription, with
+    ``None`` values when the user has none.
+
+    Whether the subscription is active is derived from ``end_date`` when it
+    is read, so a cached status expires exactly at the end of the period.
+    """
+    key = _status_key(user_id)
+    status = cache.get(key)
+    if status is None:
+        from .models import Subscription
+
+        subscription = (
+            Subscription.objects.filter(user_id=user_id)
+            .values("plan__duration", "end_date")
+            .first()
+        )
+        status = {
+            "plan": subscription["plan__duration"] if subscription else None,
+            "end_date": subscription["end_date"] if subscription else None,
+        }
+        cache.set(key, status, SUBSCRIPTION_STATUS_TIMEOUT)
+    return status
+
+
+def has_active_subscription(user_id):
+    end_date = get_subscription_status(user_id)["end_date"]
+    return end_date is not None and timezone.now() < end_date
+
+
+def invalidate_subscription_status(user_id):
+    cache.delete(_status_key(user_id))
+    # Deleted again on commit, so a request that read the old row in the
+    # meantime cannot leave it cached.
+    transaction.on_commit(partial(cache.delete, _status_key(user_id)), robust=True)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0008_alter_payment_phone'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='subscription',
+            name='end_date',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -29,7 +29,7 @@ class Subscription(models.Model):
         Plan, on_delete=models.CASCADE, related_name="subscriptions"
     )
     start_date = models.DateTimeField(auto_now_add=True)
-    end_date = models.DateTimeField(blank=True, null=True)
+    end_date = models.DateTimeField(blank=True, null=True, db_index=True)
 
     def save(self, *args, **kwargs):
         if not self.start_date:
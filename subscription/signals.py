@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from account.profiles import invalidate_profile
+from vunderkids.caching import bump_version
+from .cache import invalidate_subscription_status
+from .models import Plan, Subscription
+
+
+@receiver(post_save, sender=Plan)
+@receiver(post_delete, sender=Plan)
+def invalidate_plans(sender, **kwargs):
+    bump_version("plans")
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_subscription(sender, instance, **kwargs):
+    invalidate_subscription_status(instance.user_id)
+    invalidate_profile(instance.user_id)
@@ -1,3 +1,94 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.test import APIClient
+
+from account.models import Parent, User
+from account.permissions import HasSubscription
+from subscription.cache import get_subscription_status, has_active_subscription
+from subscription.models import Payment, Plan, Subscription
+
+
+class SubscriptionStatusCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='parent@example.com', role='parent')
+        Parent.objects.create(user=self.user)
+        self.plan = Plan.objects.create(duration='monthly', price=1000)
+
+    def check_permission(self):
+        request = RequestFactory().get('/api/courses/1/sections/1/chapters/1/tasks/')
+        request.user = self.user
+        return HasSubscription().has_permission(request, None)
+
+    def test_permission_check_is_cached(self):
+        Subscription.objects.create(user=self.user, plan=self.plan)
+        self.assertTrue(self.check_permission())
+        with self.assertNumQueries(0):
+            self.assertTrue(self.check_permission())
+
+    def test_missing_subscription_is_cached(self):
+        with self.assertRaises(PermissionDenied):
+            self.check_permission()
+        with self.assertNumQueries(0), self.assertRaises(PermissionDenied):
+            self.check_permission()
+
+    def test_status_expires_at_end_date(self):
+        subscription = Subscription.objects.create(user=self.user, plan=self.plan)
+        self.assertTrue(has_active_subscription(self.user.pk))
+        with mock.patch('subscription.cache.timezone.now', return_value=subscription.end_date):
+            with self.assertNumQueries(0):
+                self.assertFalse(has_active_subscription(self.user.pk))
+
+    def test_save_and_delete_invalidate_status(self):
+        subscription = Subscription.objects.create(user=self.user, plan=self.plan)
+        self.assertTrue(has_active_subscription(self.user.pk))
+
+        subscription.end_date = timezone.now() - timedelta(days=1)
+        subscription.save()
+        self.assertFalse(has_active_subscription(self.user.pk))
+
+        subscription.delete()
+        self.assertEqual(get_subscription_status(self.user.pk), {'plan': None, 'end_date': None})
+
+    def test_payment_confirmation_activates_subscription(self):
+        self.assertFalse(has_active_subscription(self.user.pk))
+        Payment.objects.create(
+            invoice_id='000000000001',
+            invoice_id_alt='000000000002',
+            user=self.user,
+            amount=1000,
+            duration='monthly',
+            status='pending',
+        )
+        response = APIClient().post(
+            '/api/payments/payment-confirmation/',
+            {'invoiceId': '000000000001', 'code': 'ok'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(has_active_subscription(self.user.pk))
+        self.assertEqual(get_subscription_status(self.user.pk)['plan'], 'monthly')
+
+
+# The production cache settings pointed at a Redis server that is not running.
+UNREACHABLE_CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:1/0',
+        'OPTIONS': {'IGNORE_EXCEPTIONS': True, 'SOCKET_CONNECT_TIMEOUT': 1},
+    }
+}
+
+
+@override_settings(CACHES=UNREACHABLE_CACHES, DJANGO_REDIS_LOG_IGNORED_EXCEPTIONS=False)
+class SubscriptionStatusCacheOutageTest(TestCase):
+    def test_status_is_read_from_the_database(self):
+        user = User.objects.create_user(email='parent@example.com', role='parent')
+        self.assertFalse(has_active_subscription(user.pk))
+        Subscription.objects.create(user=user, plan=Plan.objects.create(duration='monthly', price=1000))
+        self.assertTrue(has_active_subscription(user.pk))
@@ -8,10 +8,12 @@ from rest_framework.permissions import AllowAny
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import PermissionDenied
 from account.permissions import IsParent, IsStudent, IsSuperUser
+from .cache import invalidate_subscription_status
 from .models import Payment, Plan, Subscription
 from .utils import generate_invoice_id
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
+from vunderkids.caching import cache_response
 from .serializers import (
     PaymentSerializer,
     PlanSerializer,
@@ -28,6 +30,14 @@ class PlanViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Plan.objects.filter(is_enabled=True)
     serializer_class = PlanSerializer
 
+    @cache_response("plans")
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response("plans")
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class SubscriptionViewSet(viewsets.ModelViewSet):
     queryset = Subscription.objects.all()
@@ -163,6 +173,7 @@ def payment_confirmation(request):
 
         if serializer.is_valid():
             subscription = serializer.save()
+            invalidate_subscription_status(user.pk)
             return Response(
                 {
                     "message": "Subscription created successfully",
@@ -9,6 +9,7 @@ from .models import (
     Question,
     Answer,
     TaskCompletion,
+    DailyActivity,
 )
 
 
@@ -82,5 +83,36 @@ class TaskCompletionAdmin(admin.ModelAdmin):
     list_filter = ("task__chapter__section__course__name", "completed_at")
     raw_id_fields = ("user", "child", "task")
 
+    def save_model(self, request, obj, form, change):
+        # Keep the daily activity rollup in line with the edited completion.
+        previous = TaskCompletion.objects.filter(pk=obj.pk).first() if change else None
+        super().save_model(request, obj, form, change)
+        if previous is not None:
+            DailyActivity.objects.record(
+                previous.completed_at.date(),
+                tasks=-1,
+                correct=-previous.correct,
+                wrong=-previous.wrong,
+                user=previous.user,
+                child=previous.child,
+            )
+        DailyActivity.objects.record(
+            obj.completed_at.date(),
+            tasks=1,
+            correct=obj.correct,
+            wrong=obj.wrong,
+            user=obj.user,
+            child=obj.child,
+        )
+
+
+# Register DailyActivity model with customizations
+@admin.register(DailyActivity)
+class DailyActivityAdmin(admin.ModelAdmin):
+    list_display = ("user", "child", "date", "tasks", "correct", "wrong", "cups")
+    search_fields = ("user__email", "child__first_name")
+    list_filter = ("date",)
+    raw_id_fields = ("user", "child")
+
 
 admin.site.register(Chapter)
@@ -0,0 +1,204 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FilteredRelation, Q
+from django.utils import timezone
+
+from account import leaderboard
+from account.levels import get_level
+from account.models import Child, Student, get_streak_changes
+from account.profiles import invalidate_learner_profile
+from .models import Answer, DailyActivity, Question, TaskCompletion
+
+REWARD_MESSAGE = "Answer processed, reward is given"
+NO_REWARD_MESSAGE = "Answer processed, but no reward is given"
+
+
+def validate_answer(question, answer):
+    if question.question_type in [
+        "multiple_choice_text",
+        "multiple_choice_images",
+        "true_false",
+        "drag_position",
+        "number_line",
+    ]:
+        return int(answer) == question.correct_answer
+    elif question.question_type in ["drag_and_drop_text", "drag_and_drop_images"]:
+        return answer == question.correct_answer
+    elif question.question_type == "mark_all":
+        return set(answer) == set(question.correct_answer)
+    return False
+
+
+def _lock_learner(user=None, child=None):
+    if user is not None:
+        return Student.objects.select_for_update().get(user=user)
+    return Child.objects.select_for_update().get(pk=child.pk)
+
+
+def _count_task_answers(task_id, user=None, child=None):
+    if user is not None:
+        condition = Q(answers__user=user)
+    else:
+        condition = Q(answers__child=child)
+    return (
+        Question.objects.filter(task_id=task_id)
+        .annotate(learner_answer=FilteredRelation("answers", condition=condition))
+        .aggregate(
+            total=Count("pk"),
+            answered=Count("learner_answer"),
+            correct=Count("learner_answer", filter=Q(learner_answer__is_correct=True)),
+        )
+    )
+
+
+def _record_progress(learner, task_id, new_correct, user=None, child=None):
+    """
+    Apply the rewards, level, task completion and streak that follow from new
+    answers to a task, writing the learner row at most once.
+
+    Returns False when the task completion was already up to date, which the
+    answer endpoints report as "no reward".
+    """
+    changes = {}
+    reward = settings.QUESTION_REWARD * new_correct
+    if reward:
+        changes["cups"] = F("cups") + reward
+        changes["stars"] = F("stars") + reward
+        level = get_level(learner.cups + reward, default=learner.level)
+        if level != learner.level:
+            changes["level"] = level
+
+    rewarded = True
+    counts = _count_task_answers(task_id, user=user, child=child)
+    if counts["answered"] == counts["total"]:
+        correct = counts["correct"]
+        wrong = counts["answered"] - correct
+        task_completion, created = TaskCompletion.objects.get_or_create(
+            user=user,
+            child=child,
+            task_id=task_id,
+            defaults={"correct": correct, "wrong": wrong},
+        )
+        if created:
+            DailyActivity.objects.record(
+                task_completion.completed_at.date(),
+                tasks=1,
+                correct=correct,
+                wrong=wrong,
+                user=user,
+                child=child,
+            )
+        elif task_completion.correct == correct and task_completion.wrong == wrong:
+            rewarded = False
+        else:
+            DailyActivity.objects.record(
+                task_completion.completed_at.date(),
+                correct=correct - task_completion.correct,
+                wrong=wrong - task_completion.wrong,
+                user=user,
+                child=child,
+            )
+            task_completion.correct = correct
+            task_completion.wrong = wrong
+            task_completion.save(update_fields=["correct", "wrong"])
+
+        if rewarded:
+            changes.update(
+                get_streak_changes(
+                    learner.streak, learner.last_task_completed_at, timezone.now()
+                )
+            )
+
+    if changes:
+        type(learner).objects.filter(pk=learner.pk).update(**changes)
+        invalidate_learner_profile(
+            user_id=user.pk if user is not None else None,
+            child_id=child.pk if child is not None else None,
+        )
+    if reward:
+        # The row is locked, so the cups read with it plus the reward are the
+        # learner's current score.
+        learner.cups += reward
+        transaction.on_commit(partial(leaderboard.sync_learner, learner), robust=True)
+    return rewarded
+
+
+def submit_answer(question, answer_text, is_correct, user=None, child=None):
+    """
+    Record a single answer for a student (``user``) or a child.
+
+    The learner row is locked for the duration of the transaction and the
+    ``Answer`` unique constraint decides whether the question was already
+    answered, so concurrent submissions cannot be rewarded twice.
+    """
+    with transaction.atomic():
+        learner = _lock_learner(user=user, child=child)
+        try:
+            with transaction.atomic():
+                Answer.objects.create(
+                    user=user,
+                    child=child,
+                    question=question,
+                    answer=answer_text,
+                    is_correct=is_correct,
+                )
+        except IntegrityError:
+            return {"message": NO_REWARD_MESSAGE, "is_correct": is_correct}
+
+        rewarded = _record_progress(
+            learner, question.task_id, int(is_correct), user=user, child=child
+        )
+
+    return {
+        "message": REWARD_MESSAGE if rewarded else NO_REWARD_MESSAGE,
+        "is_correct": is_correct,
+    }
+
+
+def submit_task_answers(task, graded_answers, user=None, child=None):
+    """
+    Record all answers to a task at once.
+
+    ``graded_answers`` is a list of ``(question, answer_text, is_correct)``
+    tuples. Questions the learner has already answered keep their first
+    answer; the remaining ones are bulk-inserted and rewards, level, task
+    completion and streak are updated once for the whole batch.
+    """
+    learner_filter = {"user": user} if user is not None else {"child": child}
+    with transaction.atomic():
+        learner = _lock_learner(user=user, child=child)
+        answered = set(
+            Answer.objects.filter(
+                question__in=[question for question, _, _ in graded_answers],
+                **learner_filter,
+            ).values_list("question_id", flat=True)
+        )
+        new_answers = [
+            Answer(
+                user=user,
+                child=child,
+                question=question,
+                answer=answer_text,
+                is_correct=is_correct,
+            )
+            for question, answer_text, is_correct in graded_answers
+            if question.pk not in answered
+        ]
+
+        rewarded = False
+        if new_answers:
+            Answer.objects.bulk_create(new_answers, ignore_conflicts=True)
+            new_correct = sum(answer.is_correct for answer in new_answers)
+            rewarded = _record_progress(
+                learner, task.pk, new_correct, user=user, child=child
+            )
+
+    return {
+        "message": REWARD_MESSAGE if rewarded else NO_REWARD_MESSAGE,
+        "results": [
+            {"question_id": question.pk, "is_correct": is_correct}
+            for question, _, is_correct in graded_answers
+        ],
+    }
@@ -0,0 +1,123 @@
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from vunderkids.caching import bump_version, get_versions
+
+from .models import Chapter, Course, Section
+
+# Trees are only rebuilt when the version of their course changes, so the
+# versions must live in a cache shared by every process (the Redis ``CACHES``
+# of the base settings); with a per-process cache other workers would keep
+# serving the old tree until it times out.
+COURSE_TREE_TIMEOUT = 60 * 60 * 24
+# Version scope of the cached course list responses, see vunderkids.caching.
+COURSE_CATALOG_SCOPE = "courses"
+
+
+def course_tree_scope(course_id):
+    return f"course_tree:{course_id}"
+
+
+def _tree_key(course_id, version):
+    return f"course_tree:{course_id}:{version}"
+
+
+def bump_content_version(course_id):
+    bump_version(course_tree_scope(course_id))
+    bump_version(COURSE_CATALOG_SCOPE)
+
+
+def build_course_trees(course_ids):
+    """
+    Serialize the learner-independent part of each course: the course summary
+    and its full section -> chapter -> content tree, with task totals but no
+    progress.
+    """
+    from .serializers import CourseSerializer, SectionSerializer
+
+    courses = Course.objects.filter(pk__in=course_ids).with_progress().prefetch_related(
+        Prefetch(
+            "sections",
+            queryset=Section.objects.order_by("order")
+            .with_progress()
+            .prefetch_related(
+                Prefetch("chapters", queryset=Chapter.objects.with_progress()),
+                "chapters__contents",
+            ),
+        )
+    )
+    return {
+        course.pk: {
+            "course": CourseSerializer(course).data,
+            "sections": SectionSerializer(course.sections.all(), many=True).data,
+        }
+        for course in courses
+    }
+
+
+def get_course_trees(course_ids):
+    """Return the cached tree of every existing course, building stale ones."""
+    versions = get_versions([course_tree_scope(course_id) for course_id in course_ids])
+    # Courses without a version (the cache is unavailable) are always built.
+    keys = {
+        course_id: _tree_key(course_id, versions[course_tree_scope(course_id)])
+        for course_id in course_ids
+        if versions[course_tree_scope(course_id)] is not None
+    }
+    stored = cache.get_many(keys.values()) if keys else {}
+    trees = {
+        course_id: stored[key] for course_id, key in keys.items() if key in stored
+    }
+
+    missing = [course_id for course_id in course_ids if course_id not in trees]
+    if missing:
+        built = build_course_trees(missing)
+        cache.set_many(
+            {
+                keys[course_id]: tree
+                for course_id, tree in built.items()
+                if course_id in keys
+            },
+            COURSE_TREE_TIMEOUT,
+        )
+        trees.update(built)
+    return trees
+
+
+def get_course_tree(course_id):
+    return get_course_trees([course_id]).get(course_id)
+
+
+def _set_completed(node, completed_tasks):
+    total_tasks = node["total_tasks"]
+    node["completed_tasks"] = completed_tasks
+    node["percentage_completed"] = (
+        (completed_tasks * 100 / total_tasks) if total_tasks > 0 else 0
+    )
+    return node
+
+
+def apply_chapter_progress(chapter, progress):
+    _set_completed(chapter, progress.completed_in_chapter(chapter["id"]))
+    for content in chapter["contents"]:
+        if "is_completed" in content:
+            content["is_completed"] = (
+                progress.is_task_completed(content["id"])
+                if progress.is_learner
+                else None
+            )
+    return chapter
+
+
+def apply_section_progress(section, progress):
+    _set_completed(section, progress.completed_in_section(section["id"]))
+    for chapter in section.get("chapters", []):
+        apply_chapter_progress(chapter, progress)
+    return section
+
+
+def apply_course_progress(course, progress):
+    _set_completed(course, progress.completed_in_course(course["id"]))
+    for section in course["sections"]:
+        apply_section_progress(section, progress)
+    return course
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+from tasks.models import DailyActivity, TaskCompletion
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily activity rollup from task completions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = (
+            TaskCompletion.objects.annotate(date=TruncDate("completed_at"))
+            .values("user_id", "child_id", "date")
+            .annotate(tasks=Count("pk"), correct=Sum("correct"), wrong=Sum("wrong"))
+            .order_by()
+        )
+        activities = (
+            DailyActivity(cups=row["correct"] * settings.QUESTION_REWARD, **row)
+            for row in rows.iterator()
+        )
+
+        with transaction.atomic():
+            DailyActivity.objects.all().delete()
+            created = len(
+                DailyActivity.objects.bulk_create(
+                    activities, batch_size=options["batch_size"]
+                )
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Created {created} daily activities."))
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_activity(apps, schema_editor):
+    """Build the rollup from existing completions, as backfill_daily_activity does."""
+    TaskCompletion = apps.get_model("tasks", "TaskCompletion")
+    DailyActivity = apps.get_model("tasks", "DailyActivity")
+
+    rows = (
+        TaskCompletion.objects.annotate(date=TruncDate("completed_at"))
+        .values("user_id", "child_id", "date")
+        .annotate(tasks=Count("pk"), correct=Sum("correct"), wrong=Sum("wrong"))
+        .order_by()
+    )
+    DailyActivity.objects.all().delete()
+    DailyActivity.objects.bulk_create(
+        (
+            DailyActivity(cups=row["correct"] * settings.QUESTION_REWARD, **row)
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_dailyactivity'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_activity, migrations.RunPython.noop),
+    ]
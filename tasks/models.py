@@ -1,10 +1,74 @@
 from django.db import models
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from account.models import Child, LANGUAGE_CHOICES, GRADE_CHOICES
 
 User = get_user_model()
 
 
+def _count_subquery(queryset, outer_field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{outer_field: OuterRef("pk")})
+            .order_by()
+            .values(outer_field)
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def _progress_annotations(outer_field, user=None, child=None):
+    annotations = {"total_tasks": _count_subquery(Task.objects.all(), outer_field)}
+    if user is not None:
+        completions = TaskCompletion.objects.filter(user=user)
+    elif child is not None:
+        completions = TaskCompletion.objects.filter(child=child)
+    else:
+        return annotations
+    annotations["completed_tasks"] = _count_subquery(
+        completions, f"task__{outer_field}"
+    )
+    return annotations
+
+
+class CourseQuerySet(models.QuerySet):
+    def with_progress(self, user=None, child=None):
+        return self.annotate(
+            **_progress_annotations("chapter__section__course", user, child)
+        )
+
+
+class SectionQuerySet(models.QuerySet):
+    def with_progress(self, user=None, child=None):
+        return self.annotate(**_progress_annotations("chapter__section", user, child))
+
+
+class ChapterQuerySet(models.QuerySet):
+    def with_progress(self, user=None, child=None):
+        return self.annotate(**_progress_annotations("chapter", user, child))
+
+
+class TaskQuerySet(models.QuerySet):
+    def with_progress(self, user=None, child=None):
+        queryset = self.annotate(
+            total_questions=_count_subquery(Question.objects.all(), "task")
+        )
+        if user is not None:
+            completion = TaskCompletion.objects.filter(task=OuterRef("pk"), user=user)
+        elif child is not None:
+            completion = TaskCompletion.objects.filter(task=OuterRef("pk"), child=child)
+        else:
+            return queryset
+        return queryset.annotate(
+            completion_correct=Subquery(completion.values("correct")[:1]),
+            completion_wrong=Subquery(completion.values("wrong")[:1]),
+        )
+
+
 class Course(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
@@ -12,6 +76,8 @@ class Course(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     language = models.CharField(max_length=50, choices=LANGUAGE_CHOICES, default="ru")
 
+    objects = CourseQuerySet.as_manager()
+
     class Meta:
         ordering = ["grade"]
 
@@ -27,6 +93,8 @@ class Section(models.Model):
     description = models.TextField(blank=True, null=True)
     order = models.IntegerField(default=0)
 
+    objects = SectionQuerySet.as_manager()
+
     class Meta:
         ordering = ["order"]
 
@@ -50,6 +118,8 @@ class Chapter(models.Model):
         Section, related_name="chapters", null=True, on_delete=models.CASCADE
     )
 
+    objects = ChapterQuerySet.as_manager()
+
     class Meta:
         ordering = ["order"]
 
@@ -92,6 +162,8 @@ class Lesson(Content):
 
 
 class Task(Content):
+    objects = TaskQuerySet.as_manager()
+
     def __str__(self):
         return f"Task: {self.title}"
 
@@ -178,3 +250,67 @@ class TaskCompletion(models.Model):
 
     def __str__(self):
         return f"{self.user or self.child} - {self.task}"
+
+
+class DailyActivityQuerySet(models.QuerySet):
+    def record(self, date, tasks=0, correct=0, wrong=0, user=None, child=None):
+        """
+        Add completed tasks and answers to a learner's day. Callers hold the
+        learner row lock, so the update-or-create cannot race.
+        """
+        learner_filter = {"user": user} if user is not None else {"child": child}
+        cups = correct * settings.QUESTION_REWARD
+        updated = self.filter(date=date, **learner_filter).update(
+            tasks=F("tasks") + tasks,
+            correct=F("correct") + correct,
+            wrong=F("wrong") + wrong,
+            cups=F("cups") + cups,
+        )
+        if not updated:
+            self.create(
+                date=date,
+                tasks=tasks,
+                correct=correct,
+                wrong=wrong,
+                cups=cups,
+                **learner_filter,
+            )
+
+
+class DailyActivity(models.Model):
+    """
+    Per-day totals of a learner's task completions.
+
+    Kept up to date by answer submission, by deleting completions and by
+    editing them in the admin. Completions changed with ``update()`` are not
+    reflected until ``backfill_daily_activity`` is run.
+    """
+
+    user = models.ForeignKey(
+        User,
+        null=True,
+        blank=True,
+        related_name="daily_activities",
+        on_delete=models.CASCADE,
+    )
+    child = models.ForeignKey(
+        Child,
+        null=True,
+        blank=True,
+        related_name="daily_activities",
+        on_delete=models.CASCADE,
+    )
+    date = models.DateField()
+    tasks = models.IntegerField(default=0)
+    correct = models.IntegerField(default=0)
+    wrong = models.IntegerField(default=0)
+    cups = models.IntegerField(default=0)
+
+    objects = DailyActivityQuerySet.as_manager()
+
+    class Meta:
+        unique_together = (("user", "date"), ("child", "date"))
+        verbose_name_plural = "daily activities"
+
+    def __str__(self):
+        return f"{self.user or self.child} - {self.date}"
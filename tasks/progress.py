@@ -0,0 +1,224 @@
+from collections import Counter, namedtuple
+from datetime import timedelta
+from functools import cached_property
+
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from account.models import Child
+from .models import Answer, DailyActivity, TaskCompletion
+
+PROGRESS_PERIODS = {"week": 7, "month": 30, "term": 91}
+
+DAY_TOTALS = ["tasks", "correct", "wrong", "cups"]
+
+CompletedTask = namedtuple(
+    "CompletedTask", ["correct", "wrong", "chapter_id", "section_id", "course_id"]
+)
+
+
+class LearnerProgress:
+    """
+    Progress of the learner a request is made for.
+
+    Built once per request and shared by every serializer rendering that
+    request, so answers and completions are loaded with one query each no
+    matter how many questions, tasks or chapters are serialized. Views call
+    ``limit_to`` so that only the progress on the content they render is
+    loaded.
+    """
+
+    def __init__(self, user=None, child=None):
+        self.user = user
+        self.child = child
+        self.task_filter = {}
+
+    @classmethod
+    def from_request(cls, request):
+        user = request.user
+        if not user.is_authenticated:
+            return cls()
+
+        child_id = request.query_params.get("child_id")
+        if user.is_student:
+            return cls(user=user)
+        elif user.is_parent and child_id:
+            return cls(
+                child=get_object_or_404(Child, parent__user_id=user.pk, pk=child_id)
+            )
+        return cls()
+
+    @classmethod
+    def for_request(cls, request):
+        progress = getattr(request, "_learner_progress", None)
+        if progress is None:
+            progress = cls.from_request(request)
+            request._learner_progress = progress
+        return progress
+
+    @classmethod
+    def from_context(cls, context):
+        request = context.get("request", None)
+        if not request:
+            return cls()
+        return cls.for_request(request)
+
+    @property
+    def is_learner(self):
+        return self.user is not None or self.child is not None
+
+    @property
+    def learner_filter(self):
+        # Filtering on ids also works for the token-based ``ClaimsUser``.
+        if self.user is not None:
+            return {"user": self.user.pk}
+        if self.child is not None:
+            return {"child": self.child.pk}
+        return {}
+
+    def limit_to(self, **task_filter):
+        """
+        Only load progress on the tasks matching ``task_filter``, given as
+        ``Task`` lookups such as ``chapter_id=1``.
+        """
+        self.task_filter = task_filter
+        for name in ("completions", "answers", "_completed_counts"):
+            self.__dict__.pop(name, None)
+        return self
+
+    def _filter(self, task_path):
+        task_filter = {
+            f"{task_path}__{lookup}": value
+            for lookup, value in self.task_filter.items()
+        }
+        return {**self.learner_filter, **task_filter}
+
+    @cached_property
+    def completions(self):
+        """Map of task id to the learner's ``CompletedTask``."""
+        if not self.is_learner:
+            return {}
+        rows = TaskCompletion.objects.filter(**self._filter("task")).values_list(
+            "task_id",
+            "correct",
+            "wrong",
+            "task__chapter_id",
+            "task__chapter__section_id",
+            "task__chapter__section__course_id",
+        )
+        return {task_id: CompletedTask(*values) for task_id, *values in rows}
+
+    @cached_property
+    def answers(self):
+        """Map of answered question id to whether the answer was correct."""
+        if not self.is_learner:
+            return {}
+        return dict(
+            Answer.objects.filter(**self._filter("question__task")).values_list(
+                "question_id", "is_correct"
+            )
+        )
+
+    @cached_property
+    def _completed_counts(self):
+        counts = Counter()
+        for completion in self.completions.values():
+            counts["chapter", completion.chapter_id] += 1
+            counts["section", completion.section_id] += 1
+            counts["course", completion.course_id] += 1
+        return counts
+
+    def get_completion(self, task_id):
+        return self.completions.get(task_id)
+
+    def is_task_completed(self, task_id):
+        return task_id in self.completions
+
+    def is_question_answered(self, question_id):
+        return question_id in self.answers
+
+    def is_question_correct(self, question_id):
+        return self.answers.get(question_id, False)
+
+    def completed_in_chapter(self, chapter_id):
+        return self._completed_counts["chapter", chapter_id]
+
+    def completed_in_section(self, section_id):
+        return self._completed_counts["section", section_id]
+
+    def completed_in_course(self, course_id):
+        return self._completed_counts["course", course_id]
+
+
+def _activity_between(start_date, end_date, user=None, child=None):
+    learner_filter = {"user": user} if user is not None else {"child": child}
+    return DailyActivity.objects.filter(
+        date__gte=start_date, date__lte=end_date, **learner_filter
+    )
+
+
+def _days(start_date, end_date):
+    for offset in range((end_date - start_date).days + 1):
+        yield start_date + timedelta(days=offset)
+
+
+def get_period_range(period, today=None):
+    """Return the ``(start_date, end_date)`` of a period ending today."""
+    today = today or timezone.now().date()
+    return today - timedelta(days=PROGRESS_PERIODS[period] - 1), today
+
+
+def daily_cups(start_date, end_date, user=None, child=None):
+    """
+    Cups a student (``user``) or a child earned on every day from
+    ``start_date`` to ``end_date`` inclusive, as a list of ``(date, cups)``
+    pairs. Days without any activity count as zero.
+    """
+    cups_by_day = dict(
+        _activity_between(start_date, end_date, user=user, child=child).values_list(
+            "date", "cups"
+        )
+    )
+    return [(day, cups_by_day.get(day, 0)) for day in _days(start_date, end_date)]
+
+
+def format_daily_cups(progress):
+    return {
+        "weekly_progress": [
+            {"day": day.strftime("%A"), "date": day, "cups": cups}
+            for day, cups in progress
+        ]
+    }
+
+
+def _format_totals(tasks=0, correct=0, wrong=0, cups=0):
+    return {
+        "total_cups": cups,
+        "total_tasks": tasks,
+        "total_correct_answers": correct,
+        "total_wrong_answers": wrong,
+    }
+
+
+def day_totals(date, user=None, child=None):
+    """Cups, tasks, correct and wrong answers of one day."""
+    totals = (
+        _activity_between(date, date, user=user, child=child)
+        .values(*DAY_TOTALS)
+        .first()
+    )
+    return _format_totals(**(totals or {}))
+
+
+def daily_totals(start_date, end_date, user=None, child=None):
+    """The totals of ``day_totals`` for every day from ``start_date`` to ``end_date``."""
+    by_day = {
+        row.pop("date"): row
+        for row in _activity_between(
+            start_date, end_date, user=user, child=child
+        ).values("date", *DAY_TOTALS)
+    }
+    return [
+        {"date": day, **_format_totals(**by_day.get(day, {}))}
+        for day in _days(start_date, end_date)
+    ]
@@ -1,4 +1,3 @@
-from django.shortcuts import get_object_or_404
 from rest_framework import serializers
 from .models import (
     Chapter,
@@ -10,15 +9,34 @@ from .models import (
     Task,
     Question,
     TaskCompletion,
-    Answer,
 )
-from account.models import Child
+from .progress import LearnerProgress
 
 
 class AnswerSerializer(serializers.Serializer):
     answer = serializers.CharField()
 
 
+class QuestionAnswerSerializer(serializers.Serializer):
+    question_id = serializers.IntegerField()
+    answer = serializers.JSONField()
+
+    def validate_answer(self, value):
+        if value in (None, "", []):
+            raise serializers.ValidationError("Answer is required")
+        return value
+
+
+class TaskAnswersSerializer(serializers.Serializer):
+    answers = QuestionAnswerSerializer(many=True, allow_empty=False)
+
+    def validate_answers(self, value):
+        question_ids = [item["question_id"] for item in value]
+        if len(question_ids) != len(set(question_ids)):
+            raise serializers.ValidationError("Each question can be answered once.")
+        return value
+
+
 class LessonSerializer(serializers.ModelSerializer):
     class Meta:
         model = Lesson
@@ -56,36 +74,12 @@ class QuestionSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
     def get_is_attempted(self, obj):
-        request = self.context.get("request", None)
-        if not request:
-            return False
-
-        user = request.user
-        child_id = request.query_params.get("child_id")
-        if user.is_student:
-            return Answer.objects.filter(user=user, question=obj).exists()
-        elif user.is_parent:
-            child = get_object_or_404(Child, parent=user.parent, pk=child_id)
-            return Answer.objects.filter(child=child, question=obj).exists()
-        return False
+        progress = LearnerProgress.from_context(self.context)
+        return progress.is_question_answered(obj.pk)
 
     def get_is_correct(self, obj):
-        request = self.context.get("request", None)
-        if not request:
-            return False
-
-        user = request.user
-        child_id = request.query_params.get("child_id")
-        if user.is_student:
-            return Answer.objects.filter(
-                user=user, question=obj, is_correct=True
-            ).exists()
-        elif user.is_parent and child_id:
-            child = get_object_or_404(Child, parent=user.parent, pk=child_id)
-            return Answer.objects.filter(
-                child=child, question=obj, is_correct=True
-            ).exists()
-        return False
+        progress = LearnerProgress.from_context(self.context)
+        return progress.is_question_correct(obj.pk)
 
     def create(self, validated_data):
         question = Question.objects.create(**validated_data)
@@ -153,19 +147,15 @@ class TaskSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
     def get_task_completion(self, obj):
-        request = self.context.get("request", None)
-        if not request:
-            return None
-
-        user = request.user
-        child_id = request.query_params.get("child_id")
-
-        if user.is_student:
-            return TaskCompletion.objects.filter(user=user, task=obj).first()
-        elif user.is_parent and child_id:
-            child = get_object_or_404(Child, parent=user.parent, pk=child_id)
-            return TaskCompletion.objects.filter(child=child, task=obj).first()
-        return None
+        if hasattr(obj, "completion_correct"):
+            if obj.completion_correct is None:
+                return None
+            return TaskCompletion(
+                correct=obj.completion_correct, wrong=obj.completion_wrong
+            )
+
+        progress = LearnerProgress.from_context(self.context)
+        return progress.get_completion(obj.pk)
 
     def get_answered_questions(self, obj):
         task_completion = self.get_task_completion(obj)
@@ -184,6 +174,8 @@ class TaskSerializer(serializers.ModelSerializer):
         return self.get_total_questions(obj) - self.get_correct_questions(obj)
 
     def get_total_questions(self, obj):
+        if hasattr(obj, "total_questions"):
+            return obj.total_questions
         return obj.questions.count()
 
     def get_correct_questions(self, obj):
@@ -221,19 +213,9 @@ class ContentSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
     def get_is_completed(self, obj):
-        request = self.context.get("request", None)
-        if not request:
-            return None
-
-        if obj.content_type == "task":
-            user = request.user
-            child_id = request.query_params.get("child_id")
-
-            if user.is_student:
-                return TaskCompletion.objects.filter(user=user, task=obj).exists()
-            elif user.is_parent and child_id:
-                child = get_object_or_404(Child, parent=user.parent, pk=child_id)
-                return TaskCompletion.objects.filter(child=child, task=obj).exists()
+        progress = LearnerProgress.from_context(self.context)
+        if obj.content_type == "task" and progress.is_learner:
+            return progress.is_task_completed(obj.pk)
         return None
 
     def to_representation(self, instance):
@@ -254,22 +236,16 @@ class ChapterSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
     def get_total_tasks(self, obj):
+        if hasattr(obj, "total_tasks"):
+            return obj.total_tasks
         return Task.objects.filter(chapter=obj).count()
 
     def get_completed_tasks(self, obj):
-        request = self.context.get("request", None)
-        if not request:
-            return 0
+        if hasattr(obj, "completed_tasks"):
+            return obj.completed_tasks
 
-        user = request.user
-        child_id = request.query_params.get("child_id")
-        if user.is_student:
-            return TaskCompletion.objects.filter(user=user, task__chapter=obj).count()
-        elif user.is_parent and child_id:
-
-            child = get_object_or_404(Child, parent=user.parent, pk=child_id)
-            return TaskCompletion.objects.filter(child=child, task__chapter=obj).count()
-        return 0
+        progress = LearnerProgress.from_context(self.context)
+        return progress.completed_in_chapter(obj.pk)
 
     def get_percentage_completed(self, obj):
         total_tasks = self.get_total_tasks(obj)
@@ -288,26 +264,16 @@ class SectionSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
     def get_total_tasks(self, obj):
+        if hasattr(obj, "total_tasks"):
+            return obj.total_tasks
         return Task.objects.filter(chapter__section=obj).count()
 
     def get_completed_tasks(self, obj):
-        request = self.context.get("request", None)
-        if not request:
-            return 0
+        if hasattr(obj, "completed_tasks"):
+            return obj.completed_tasks
 
-        user = request.user
-        child_id = request.query_params.get("child_id")
-        if user.is_student:
-            return TaskCompletion.objects.filter(
-                user=user, task__chapter__section=obj
-            ).count()
-        elif user.is_parent and child_id:
-
-            child = get_object_or_404(Child, parent=user.parent, pk=child_id)
-            return TaskCompletion.objects.filter(
-                child=child, task__chapter__section=obj
-            ).count()
-        return 0
+        progress = LearnerProgress.from_context(self.context)
+        return progress.completed_in_section(obj.pk)
 
     def get_percentage_completed(self, obj):
         total_tasks = self.get_total_tasks(obj)
@@ -333,25 +299,16 @@ class SectionSummarySerializer(serializers.ModelSerializer):
         ]
 
     def get_total_tasks(self, obj):
+        if hasattr(obj, "total_tasks"):
+            return obj.total_tasks
         return Task.objects.filter(chapter__section=obj).count()
 
     def get_completed_tasks(self, obj):
-        request = self.context.get("request", None)
-        if not request:
-            return 0
+        if hasattr(obj, "completed_tasks"):
+            return obj.completed_tasks
 
-        user = request.user
-        child_id = request.query_params.get("child_id")
-        if user.is_student:
-            return TaskCompletion.objects.filter(
-                user=user, task__chapter__section=obj
-            ).count()
-        elif user.is_parent and child_id:
-            child = get_object_or_404(Child, parent=user.parent, pk=child_id)
-            return TaskCompletion.objects.filter(
-                child=child, task__chapter__section=obj
-            ).count()
-        return 0
+        progress = LearnerProgress.from_context(self.context)
+        return progress.completed_in_section(obj.pk)
 
     def get_percentage_completed(self, obj):
         total_tasks = self.get_total_tasks(obj)
@@ -370,26 +327,17 @@ class CourseSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
     def get_total_tasks(self, obj):
+        if hasattr(obj, "total_tasks"):
+            return obj.total_tasks
         # Adjusted query to correctly traverse the relationship
         return Task.objects.filter(chapter__section__course=obj).count()
 
     def get_completed_tasks(self, obj):
-        request = self.context.get("request", None)
-        if not request:
-            return 0
+        if hasattr(obj, "completed_tasks"):
+            return obj.completed_tasks
 
-        user = request.user
-        child_id = request.query_params.get("child_id")
-        if user.is_student:
-            return TaskCompletion.objects.filter(
-                user=user, task__chapter__section__course=obj
-            ).count()
-        elif user.is_parent and child_id:
-            child = get_object_or_404(Child, parent=user.parent, pk=child_id)
-            return TaskCompletion.objects.filter(
-                child=child, task__chapter__section__course=obj
-            ).count()
-        return 0
+        progress = LearnerProgress.from_context(self.context)
+        return progress.completed_in_course(obj.pk)
 
     def get_percentage_completed(self, obj):
         total_tasks = self.get_total_tasks(obj)
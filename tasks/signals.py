@@ -0,0 +1,90 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from account.profiles import invalidate_learner_profile
+from vunderkids.caching import bump_version, learner_scope
+from .cache import bump_content_version
+from .models import (
+    Chapter,
+    Content,
+    Course,
+    DailyActivity,
+    Image,
+    Lesson,
+    Question,
+    Section,
+    Task,
+    TaskCompletion,
+)
+
+
+def _get_course_id(instance):
+    if isinstance(instance, Course):
+        return instance.pk
+    if isinstance(instance, Section):
+        return instance.course_id
+    if isinstance(instance, Chapter):
+        lookup = Section.objects.filter(pk=instance.section_id), "course_id"
+    elif isinstance(instance, Content):
+        lookup = Chapter.objects.filter(pk=instance.chapter_id), "section__course_id"
+    elif isinstance(instance, Question):
+        lookup = (
+            Content.objects.filter(pk=instance.task_id),
+            "chapter__section__course_id",
+        )
+    else:
+        lookup = (
+            Question.objects.filter(pk=instance.question_id),
+            "task__chapter__section__course_id",
+        )
+    queryset, field = lookup
+    return queryset.values_list(field, flat=True).first()
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Section)
+@receiver(post_save, sender=Chapter)
+@receiver(post_save, sender=Content)
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=Question)
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Section)
+@receiver(post_delete, sender=Chapter)
+@receiver(post_delete, sender=Content)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=Question)
+@receiver(post_delete, sender=Image)
+def invalidate_course_tree(sender, instance, **kwargs):
+    course_id = _get_course_id(instance)
+    if course_id is not None:
+        bump_content_version(course_id)
+
+
+@receiver(post_delete, sender=TaskCompletion)
+def remove_daily_activity(sender, instance, **kwargs):
+    DailyActivity.objects.filter(
+        user_id=instance.user_id,
+        child_id=instance.child_id,
+        date=instance.completed_at.date(),
+    ).update(
+        tasks=F("tasks") - 1,
+        correct=F("correct") - instance.correct,
+        wrong=F("wrong") - instance.wrong,
+        cups=F("cups") - instance.correct * settings.QUESTION_REWARD,
+    )
+
+
+@receiver(post_save, sender=TaskCompletion)
+@receiver(post_delete, sender=TaskCompletion)
+def invalidate_learner_responses(sender, instance, **kwargs):
+    scope = learner_scope(user_id=instance.user_id, child_id=instance.child_id)
+    transaction.on_commit(partial(bump_version, scope), robust=True)
+    invalidate_learner_profile(user_id=instance.user_id, child_id=instance.child_id)
@@ -1,9 +1,12 @@
+from django.core.cache import cache
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import Course, Section, Content, Task, Question, Answer, TaskCompletion, Image
-from account.models import Child, Student
+from .models import Course, Section, Chapter, Content, Task, Question, Answer, TaskCompletion, Image, DailyActivity
+from account.models import Child, LevelRequirement, Student
+from .progress import LearnerProgress
+from subscription.models import Plan, Subscription
 
 User = get_user_model()
 
@@ -155,3 +158,338 @@ class ChildModelTest(TestCase):
     def test_child_creation(self):
         self.assertEqual(self.child.grade, 3)
         self.assertEqual(self.child.parent, self.parent)
+
+
+class CourseListQueryCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='student@example.com', password='password', role='student')
+        Student.objects.create(user=self.user, grade=1, language='ru')
+        self.client.force_authenticate(user=self.user)
+
+    def _create_course(self, sections):
+        course = Course.objects.create(name='Math', grade=1, created_by=self.user, language='ru')
+        for i in range(sections):
+            section = Section.objects.create(course=course, title=f'Section {i}')
+            chapter = Chapter.objects.create(section=section, title=f'Chapter {i}')
+            completed = Task.objects.create(chapter=chapter, title='Task 1', content_type='task')
+            Task.objects.create(chapter=chapter, title='Task 2', content_type='task')
+            TaskCompletion.objects.create(user=self.user, task=completed, correct=1)
+        return course
+
+    def test_list_query_count_is_constant(self):
+        self._create_course(sections=1)
+        with self.assertNumQueries(7):
+            response = self.client.get('/api/courses/')
+        self.assertEqual(len(response.data), 1)
+
+        for _ in range(3):
+            self._create_course(sections=4)
+        with self.assertNumQueries(7):
+            self.client.get('/api/courses/')
+        # The whole response is now cached until the content or the
+        # learner's progress changes.
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/courses/')
+        self.assertEqual(len(response.data), 4)
+
+        course = response.data[1]
+        self.assertEqual(course['total_tasks'], 8)
+        self.assertEqual(course['completed_tasks'], 4)
+        self.assertEqual(course['percentage_completed'], 50)
+        self.assertEqual(len(course['sections']), 4)
+        self.assertEqual(course['sections'][0]['total_tasks'], 2)
+        self.assertEqual(course['sections'][0]['completed_tasks'], 1)
+
+
+class SectionTreeQueryCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='student@example.com', password='password', role='student')
+        Student.objects.create(user=self.user, grade=1, language='ru')
+        self.client.force_authenticate(user=self.user)
+        self.course = Course.objects.create(name='Math', grade=1, created_by=self.user, language='ru')
+
+    def _create_section(self, chapters):
+        section = Section.objects.create(course=self.course, title='Section')
+        for i in range(chapters):
+            chapter = Chapter.objects.create(section=section, title=f'Chapter {i}')
+            Content.objects.create(chapter=chapter, title='Lesson', content_type='lesson')
+            completed = Task.objects.create(chapter=chapter, title='Task 1', content_type='task')
+            Task.objects.create(chapter=chapter, title='Task 2', content_type='task')
+            TaskCompletion.objects.create(user=self.user, task=completed, correct=1)
+        return section
+
+    def test_section_tree_query_count_is_constant(self):
+        self._create_section(chapters=1)
+        with self.assertNumQueries(5):
+            self.client.get(f'/api/courses/{self.course.id}/sections/')
+
+        self._create_section(chapters=5)
+        with self.assertNumQueries(5):
+            self.client.get(f'/api/courses/{self.course.id}/sections/')
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/courses/{self.course.id}/sections/')
+
+        section = response.data[1]
+        self.assertEqual(section['total_tasks'], 10)
+        self.assertEqual(section['completed_tasks'], 5)
+        chapter = section['chapters'][0]
+        self.assertEqual(chapter['total_tasks'], 2)
+        self.assertEqual(chapter['completed_tasks'], 1)
+        self.assertEqual([content.get('is_completed') for content in chapter['contents']], [None, True, False])
+
+
+class CourseTreeCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='student@example.com', password='password', role='student')
+        Student.objects.create(user=self.user, grade=1, language='ru')
+        self.client.force_authenticate(user=self.user)
+        self.course = Course.objects.create(name='Math', grade=1, created_by=self.user, language='ru')
+        self.section = Section.objects.create(course=self.course, title='Algebra')
+        self.chapter = Chapter.objects.create(section=self.section, title='Equations')
+        self.task = Task.objects.create(chapter=self.chapter, title='Task 1', content_type='task')
+        self.url = f'/api/courses/{self.course.id}/sections/{self.section.id}/chapters/'
+
+    def test_content_edits_invalidate_tree(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data[0]['total_tasks'], 1)
+
+        Task.objects.create(chapter=self.chapter, title='Task 2', content_type='task')
+        response = self.client.get(self.url)
+        self.assertEqual(response.data[0]['total_tasks'], 2)
+
+        self.chapter.title = 'Linear equations'
+        self.chapter.save()
+        response = self.client.get(f'{self.url}{self.chapter.id}/')
+        self.assertEqual(response.data['title'], 'Linear equations')
+
+        self.task.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data[0]['total_tasks'], 1)
+
+    def test_progress_is_merged_per_learner(self):
+        self.client.get(self.url)
+        TaskCompletion.objects.create(user=self.user, task=self.task, correct=1)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data[0]['completed_tasks'], 1)
+        self.assertEqual(response.data[0]['percentage_completed'], 100)
+        self.assertTrue(response.data[0]['contents'][0]['is_completed'])
+
+        other = User.objects.create_user(email='other@example.com', password='password', role='student')
+        Student.objects.create(user=other, grade=1, language='ru')
+        self.client.force_authenticate(user=other)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data[0]['completed_tasks'], 0)
+        self.assertFalse(response.data[0]['contents'][0]['is_completed'])
+
+
+class TaskListQueryCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='student@example.com', password='password', role='student')
+        Student.objects.create(user=self.user, grade=1, language='ru')
+        Subscription.objects.create(user=self.user, plan=Plan.objects.create(duration='annual'))
+        self.client.force_authenticate(user=self.user)
+        course = Course.objects.create(name='Math', grade=1, created_by=self.user, language='ru')
+        section = Section.objects.create(course=course, title='Algebra')
+        self.chapter = Chapter.objects.create(section=section, title='Equations')
+        self.url = f'/api/courses/{course.id}/sections/{section.id}/chapters/{self.chapter.id}/tasks/'
+
+    def _create_task(self, questions):
+        task = Task.objects.create(chapter=self.chapter, title='Task', content_type='task')
+        for i in range(questions):
+            question = Question.objects.create(
+                task=task, title=f'Question {i}', question_text='2+2?',
+                question_type='multiple_choice_text', options=[], correct_answer=1
+            )
+            Answer.objects.create(user=self.user, question=question, answer='1', is_correct=i % 2 == 0)
+        return task
+
+    def test_list_query_count_is_constant(self):
+        self._create_task(questions=2)
+        # The first request also loads the subscription status into the cache.
+        with self.assertNumQueries(5):
+            self.client.get(self.url)
+
+        for _ in range(4):
+            task = self._create_task(questions=4)
+        TaskCompletion.objects.create(user=self.user, task=task, correct=2, wrong=2)
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+
+        data = response.data[-1]
+        self.assertEqual(data['total_questions'], 4)
+        self.assertEqual(data['answered_questions'], 4)
+        self.assertEqual(data['correct_questions'], 2)
+        self.assertEqual(data['incorrect_questions'], 2)
+        self.assertEqual(data['progress'], 100)
+        self.assertTrue(data['is_completed'])
+        self.assertFalse(response.data[0]['is_completed'])
+        self.assertEqual([question['is_correct'] for question in data['questions']], [True, False, True, False])
+
+        with self.assertNumQueries(4):
+            response = self.client.get(f'{self.url}{task.id}/')
+        self.assertEqual(response.data['correct_questions'], 2)
+
+
+class LearnerProgressScopeTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='student@example.com', password='password', role='student')
+        course = Course.objects.create(name='Math', grade=1, created_by=self.user, language='ru')
+        section = Section.objects.create(course=course, title='Algebra')
+        self.chapters = [Chapter.objects.create(section=section, title=f'Chapter {i}') for i in range(2)]
+        self.tasks = []
+        for chapter in self.chapters:
+            task = Task.objects.create(chapter=chapter, title='Task', content_type='task')
+            question = Question.objects.create(
+                task=task, title='Question', question_text='2+2?',
+                question_type='multiple_choice_text', options=[], correct_answer=1
+            )
+            Answer.objects.create(user=self.user, question=question, answer='1', is_correct=True)
+            TaskCompletion.objects.create(user=self.user, task=task, correct=1)
+            self.tasks.append(task)
+
+    def test_progress_is_loaded_for_rendered_tasks_only(self):
+        progress = LearnerProgress(user=self.user).limit_to(chapter_id=self.chapters[0].pk)
+        self.assertEqual(list(progress.completions), [self.tasks[0].pk])
+        self.assertEqual(list(progress.answers), [self.tasks[0].questions.get().pk])
+        self.assertEqual(progress.completed_in_chapter(self.chapters[1].pk), 0)
+
+        progress.limit_to(chapter__section_id=self.chapters[0].section_id)
+        self.assertEqual(len(progress.completions), 2)
+
+
+class AnswerSubmissionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='student@example.com', password='password', role='student')
+        self.student = Student.objects.create(user=self.user, grade=1, language='ru')
+        self.client.force_authenticate(user=self.user)
+        LevelRequirement.objects.create(level=2, cups_required=5)
+        LevelRequirement.objects.create(level=3, cups_required=100)
+        course = Course.objects.create(name='Math', grade=1, created_by=self.user, language='ru')
+        section = Section.objects.create(course=course, title='Algebra')
+        chapter = Chapter.objects.create(section=section, title='Equations')
+        self.task = Task.objects.create(chapter=chapter, title='Task', content_type='task')
+        self.questions = [
+            Question.objects.create(
+                task=self.task, title=f'Question {i}', question_text='2+2?',
+                question_type='multiple_choice_text', options=[], correct_answer=1
+            )
+            for i in range(2)
+        ]
+        self.base_url = f'/api/courses/{course.id}/sections/{section.id}/chapters/{chapter.id}/tasks/{self.task.id}/questions/'
+
+    def _answer(self, question, answer):
+        return self.client.post(f'{self.base_url}{question.id}/answer/', {'answer': answer})
+
+    def test_answers_update_rewards_and_completion(self):
+        with self.assertNumQueries(10):
+            response = self._answer(self.questions[0], '1')
+        self.assertTrue(response.data['is_correct'])
+        self.assertEqual(response.data['message'], 'Answer processed, reward is given')
+        self.student.refresh_from_db()
+        self.assertEqual((self.student.cups, self.student.stars, self.student.level), (5, 5, 2))
+        self.assertFalse(TaskCompletion.objects.exists())
+
+        response = self._answer(self.questions[1], '0')
+        self.assertFalse(response.data['is_correct'])
+        completion = TaskCompletion.objects.get(user=self.user, task=self.task)
+        self.assertEqual((completion.correct, completion.wrong), (1, 1))
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.cups, 5)
+        self.assertEqual(self.student.streak, 1)
+        self.assertIsNotNone(self.student.last_task_completed_at)
+
+        activity = DailyActivity.objects.get(user=self.user, date=completion.completed_at.date())
+        self.assertEqual((activity.tasks, activity.correct, activity.wrong, activity.cups), (1, 1, 1, 5))
+        completion.delete()
+        activity.refresh_from_db()
+        self.assertEqual((activity.tasks, activity.correct, activity.wrong, activity.cups), (0, 0, 0, 0))
+
+    def test_malformed_answer_is_rejected(self):
+        question = self.questions[0]
+        response = self.client.post(f'{self.base_url}{question.id}/answer/', {'answer': 'abc'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], f'Invalid answer to question {question.id}')
+        self.assertFalse(Answer.objects.exists())
+
+    def test_repeated_answer_is_not_rewarded(self):
+        self._answer(self.questions[0], '1')
+        response = self._answer(self.questions[0], '1')
+        self.assertEqual(response.data['message'], 'Answer processed, but no reward is given')
+        self.assertEqual(Answer.objects.count(), 1)
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.cups, 5)
+
+
+class TaskAnswersBatchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='student@example.com', password='password', role='student')
+        self.student = Student.objects.create(user=self.user, grade=1, language='ru')
+        self.client.force_authenticate(user=self.user)
+        course = Course.objects.create(name='Math', grade=1, created_by=self.user, language='ru')
+        section = Section.objects.create(course=course, title='Algebra')
+        chapter = Chapter.objects.create(section=section, title='Equations')
+        self.task = Task.objects.create(chapter=chapter, title='Task', content_type='task')
+        self.questions = [
+            Question.objects.create(
+                task=self.task, title=f'Question {i}', question_text='2+2?',
+                question_type='multiple_choice_text', options=[], correct_answer=1
+            )
+            for i in range(3)
+        ]
+        self.url = f'/api/courses/{course.id}/sections/{section.id}/chapters/{chapter.id}/tasks/{self.task.id}/answers/'
+
+    def test_batch_answers_complete_task_once(self):
+        answers = [
+            {'question_id': self.questions[0].id, 'answer': '1'},
+            {'question_id': self.questions[1].id, 'answer': '0'},
+            {'question_id': self.questions[2].id, 'answer': '1'},
+        ]
+        response = self.client.post(self.url, {'answers': answers}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([result['is_correct'] for result in response.data['results']], [True, False, True])
+        self.assertEqual(Answer.objects.filter(user=self.user).count(), 3)
+
+        completion = TaskCompletion.objects.get(user=self.user, task=self.task)
+        self.assertEqual((completion.correct, completion.wrong), (2, 1))
+        self.student.refresh_from_db()
+        self.assertEqual((self.student.cups, self.student.stars, self.student.streak), (10, 10, 1))
+
+        response = self.client.post(self.url, {'answers': answers}, format='json')
+        self.assertEqual(response.data['message'], 'Answer processed, but no reward is given')
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.cups, 10)
+
+    def test_rejects_questions_from_other_tasks(self):
+        other_task = Task.objects.create(chapter=self.task.chapter, title='Other', content_type='task')
+        question = Question.objects.create(
+            task=other_task, title='Question', question_text='2+2?',
+            question_type='multiple_choice_text', options=[], correct_answer=1
+        )
+        response = self.client.post(self.url, {'answers': [{'question_id': question.id, 'answer': '1'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Answer.objects.exists())
+
+    def test_rejects_answers_of_the_wrong_shape(self):
+        question = self.questions[1]
+        for answer in ['abc', [1], {'x': 1}]:
+            answers = [
+                {'question_id': self.questions[0].id, 'answer': '1'},
+                {'question_id': question.id, 'answer': answer},
+            ]
+            response = self.client.post(self.url, {'answers': answers}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data['message'], f'Invalid answer to question {question.id}')
+        self.assertFalse(Answer.objects.exists())
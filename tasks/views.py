@@ -1,13 +1,14 @@
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from account.authentication import ClaimsJWTAuthentication
 from account.permissions import IsSuperUserOrStaffOrReadOnly, HasSubscription
 from account.models import Student, Child
 from rest_framework.permissions import AllowAny
 from .models import (
-    Answer,
     Chapter,
     Course,
     Image,
@@ -27,7 +28,19 @@ from .serializers import (
     TaskSerializer,
     QuestionSerializer,
     TaskSummarySerializer,
+    TaskAnswersSerializer,
 )
+from .answers import submit_answer, submit_task_answers, validate_answer
+from .cache import (
+    COURSE_CATALOG_SCOPE,
+    apply_chapter_progress,
+    apply_course_progress,
+    apply_section_progress,
+    get_course_tree,
+    get_course_trees,
+)
+from .progress import LearnerProgress
+from vunderkids.caching import cache_response
 from rest_framework.views import APIView
 from django.utils import timezone
 
@@ -35,27 +48,37 @@ from django.utils import timezone
 class CourseViewSet(viewsets.ModelViewSet):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsSuperUserOrStaffOrReadOnly]
 
+    @cache_response(COURSE_CATALOG_SCOPE, per_learner=True)
     def list(self, request):
         user = request.user
         child_id = request.query_params.get("child_id", None)
 
         if user.is_student:
-            student = get_object_or_404(Student, user=user)
+            student = get_object_or_404(Student, user_id=user.pk)
             queryset = Course.objects.filter(
                 grade=student.grade, language=student.language
             )
+            progress = LearnerProgress(user=user)
         elif user.is_parent and child_id:
-            child = get_object_or_404(Child, parent=user.parent, pk=child_id)
+            child = get_object_or_404(Child, parent__user_id=user.pk, pk=child_id)
             queryset = Course.objects.filter(grade=child.grade, language=child.language)
+            progress = LearnerProgress(child=child)
         else:
             queryset = Course.objects.all()
-
-        serializer = self.serializer_class(
-            queryset, many=True, context={"request": request}
-        )
-        return Response(serializer.data)
+            progress = LearnerProgress()
+
+        course_ids = list(queryset.values_list("pk", flat=True))
+        progress.limit_to(chapter__section__course_id__in=course_ids)
+        trees = get_course_trees(course_ids)
+        data = [
+            apply_course_progress(trees[course_id]["course"], progress)
+            for course_id in course_ids
+            if course_id in trees
+        ]
+        return Response(data)
 
     def create(self, request):
         user = request.user
@@ -76,19 +99,37 @@ class CourseViewSet(viewsets.ModelViewSet):
 class SectionViewSet(viewsets.ModelViewSet):
     queryset = Section.objects.all()
     serializer_class = SectionSerializer
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsSuperUserOrStaffOrReadOnly]
 
     def get_queryset(self):
+        # Reads are served from the cached course tree, see list and retrieve.
         return Section.objects.filter(course_id=self.kwargs["course_pk"]).order_by(
             "order"
         )
 
+    def _get_cached_sections(self, course_pk):
+        tree = get_course_tree(int(course_pk))
+        return tree["sections"] if tree else []
+
     def list(self, request, course_pk=None):
-        queryset = self.get_queryset()
-        serializer = SectionSerializer(
-            queryset, many=True, context={"request": request}
+        progress = LearnerProgress.for_request(request).limit_to(
+            chapter__section__course_id=course_pk
         )
-        return Response(serializer.data)
+        data = [
+            apply_section_progress(section, progress)
+            for section in self._get_cached_sections(course_pk)
+        ]
+        return Response(data)
+
+    def retrieve(self, request, pk=None, course_pk=None):
+        for section in self._get_cached_sections(course_pk):
+            if str(section["id"]) == str(pk):
+                progress = LearnerProgress.for_request(request).limit_to(
+                    chapter__section_id=section["id"]
+                )
+                return Response(apply_section_progress(section, progress))
+        raise Http404
 
     def create(self, request, course_pk=None):
         data = request.data.copy()
@@ -117,13 +158,40 @@ class SectionViewSet(viewsets.ModelViewSet):
 class ChapterViewSet(viewsets.ModelViewSet):
     queryset = Chapter.objects.all()
     serializer_class = ChapterSerializer
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsSuperUserOrStaffOrReadOnly]
 
     def get_queryset(self):
+        # Reads are served from the cached course tree, see list and retrieve.
         return Chapter.objects.filter(section_id=self.kwargs["section_pk"]).order_by(
             "order"
         )
 
+    def _get_cached_chapters(self, course_pk, section_pk):
+        tree = get_course_tree(int(course_pk))
+        if tree:
+            for section in tree["sections"]:
+                if str(section["id"]) == str(section_pk):
+                    return section["chapters"]
+        return []
+
+    def list(self, request, course_pk=None, section_pk=None):
+        progress = LearnerProgress.for_request(request).limit_to(
+            chapter__section_id=section_pk
+        )
+        chapters = self._get_cached_chapters(course_pk, section_pk)
+        data = [apply_chapter_progress(chapter, progress) for chapter in chapters]
+        return Response(data)
+
+    def retrieve(self, request, pk=None, course_pk=None, section_pk=None):
+        for chapter in self._get_cached_chapters(course_pk, section_pk):
+            if str(chapter["id"]) == str(pk):
+                progress = LearnerProgress.for_request(request).limit_to(
+                    chapter_id=chapter["id"]
+                )
+                return Response(apply_chapter_progress(chapter, progress))
+        raise Http404
+
     def create(self, request, course_pk=None, section_pk=None):
         data = request.data.copy()
         data["section"] = section_pk
@@ -137,6 +205,7 @@ class ChapterViewSet(viewsets.ModelViewSet):
 class ContentViewSet(viewsets.ModelViewSet):
     queryset = Content.objects.all()
     serializer_class = ContentSerializer
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsSuperUserOrStaffOrReadOnly]
 
     def get_queryset(self):
@@ -188,6 +257,7 @@ class ContentViewSet(viewsets.ModelViewSet):
 class LessonViewSet(viewsets.ModelViewSet):
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [HasSubscription, IsSuperUserOrStaffOrReadOnly]
 
     def get_queryset(self):
@@ -225,12 +295,21 @@ class LessonViewSet(viewsets.ModelViewSet):
 class TaskViewSet(viewsets.ModelViewSet):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [HasSubscription, IsSuperUserOrStaffOrReadOnly]
 
     def get_queryset(self):
-        return Task.objects.filter(chapter_id=self.kwargs["chapter_pk"]).order_by(
+        queryset = Task.objects.filter(chapter_id=self.kwargs["chapter_pk"]).order_by(
             "order"
         )
+        if self.action in ["list", "retrieve"]:
+            progress = LearnerProgress.for_request(self.request).limit_to(
+                chapter_id=self.kwargs["chapter_pk"]
+            )
+            queryset = queryset.with_progress(
+                **progress.learner_filter
+            ).prefetch_related("questions__images")
+        return queryset
 
     def get_serializer_class(self):
         if self.action in ["list", "retrieve"]:
@@ -265,6 +344,52 @@ class TaskViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="answers",
+        permission_classes=[IsAuthenticated],
+    )
+    def answers(self, request, *args, **kwargs):
+        task = self.get_object()
+        user = request.user
+        child_id = request.data.get("child_id")
+
+        serializer = TaskAnswersSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        if user.is_student:
+            learner = {"user": user}
+        elif user.is_parent and child_id:
+            learner = {"child": get_object_or_404(Child, parent=user.parent, pk=child_id)}
+        else:
+            return Response(
+                {"message": "Invalid request. Parent must provide child_id."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        questions = {question.pk: question for question in task.questions.all()}
+        graded_answers = []
+        for item in serializer.validated_data["answers"]:
+            question = questions.get(item["question_id"])
+            if question is None:
+                return Response(
+                    {"message": f"Question {item['question_id']} is not in this task"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            try:
+                is_correct = validate_answer(question, item["answer"])
+            except (TypeError, ValueError):
+                return Response(
+                    {"message": f"Invalid answer to question {question.pk}"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            graded_answers.append((question, item["answer"], is_correct))
+
+        result = submit_task_answers(task, graded_answers, **learner)
+        return Response(result, status=status.HTTP_200_OK)
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({"request": self.request})
@@ -274,9 +399,14 @@ class TaskViewSet(viewsets.ModelViewSet):
 class QuestionViewSet(viewsets.ModelViewSet):
     queryset = Question.objects.all()
     serializer_class = QuestionSerializer
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [HasSubscription, IsSuperUserOrStaffOrReadOnly]
 
     def get_queryset(self):
+        if self.action in ["list", "retrieve"]:
+            LearnerProgress.for_request(self.request).limit_to(
+                pk=self.kwargs["task_pk"]
+            )
         return Question.objects.filter(task_id=self.kwargs["task_pk"])
 
     def create(self, request, *args, **kwargs):
@@ -332,23 +462,19 @@ class QuestionViewSet(viewsets.ModelViewSet):
                 {"message": "Answer is required"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        is_correct = self.validate_answer(question, answer_text)
+        try:
+            is_correct = validate_answer(question, answer_text)
+        except (TypeError, ValueError):
+            return Response(
+                {"message": f"Invalid answer to question {question.pk}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         if user.is_student:
-            result = self.handle_answer(
-                user=user,
-                question=question,
-                answer_text=answer_text,
-                is_correct=is_correct,
-            )
+            result = submit_answer(question, answer_text, is_correct, user=user)
         elif user.is_parent and child_id:
             child = get_object_or_404(Child, parent=user.parent, pk=child_id)
-            result = self.handle_answer(
-                child=child,
-                question=question,
-                answer_text=answer_text,
-                is_correct=is_correct,
-            )
+            result = submit_answer(question, answer_text, is_correct, child=child)
         else:
             return Response(
                 {"message": "Invalid request. Parent must provide child_id."},
@@ -357,84 +483,6 @@ class QuestionViewSet(viewsets.ModelViewSet):
 
         return Response(result, status=status.HTTP_200_OK)
 
-    def validate_answer(self, question, answer):
-        if question.question_type in [
-            "multiple_choice_text",
-            "multiple_choice_images",
-            "true_false",
-            "drag_position",
-            "number_line",
-        ]:
-            return int(answer) == question.correct_answer
-        elif question.question_type in ["drag_and_drop_text", "drag_and_drop_images"]:
-            return answer == question.correct_answer
-        elif question.question_type == "mark_all":
-            return set(answer) == set(question.correct_answer)
-        return False
-
-    def handle_answer(
-        self, user=None, child=None, question=None, answer_text=None, is_correct=False
-    ):
-        entity = user.student if user else child
-
-        is_answer_exists = Answer.objects.filter(
-            user=user, child=child, question=question
-        ).exists()
-
-        if is_answer_exists:
-            return {
-                "message": "Answer processed, but no reward is given",
-                "is_correct": is_correct,
-            }
-
-        Answer.objects.create(
-            user=user if user else None,
-            child=child if child else None,
-            question=question,
-            answer=answer_text,
-            is_correct=is_correct,
-        )
-
-        if is_correct:
-            entity.add_question_reward()
-            entity.update_level()
-
-        # Handle task completion
-        task = question.task
-        total_questions = task.questions.count()
-        answered_questions = Answer.objects.filter(
-            user=user, child=child, question__task=task
-        ).count()
-
-        correct_answers = Answer.objects.filter(
-            user=user, child=child, question__task=task, is_correct=True
-        ).count()
-
-        wrong_answers = answered_questions - correct_answers
-
-        if answered_questions == total_questions:
-            task_completion, created = TaskCompletion.objects.get_or_create(
-                user=user if user else None, child=child if child else None, task=task
-            )
-            if (
-                task_completion.correct == correct_answers
-                and task_completion.wrong == wrong_answers
-            ):
-                return {
-                    "message": "Answer processed, but no reward is given",
-                    "is_correct": is_correct,
-                }
-            task_completion.correct = correct_answers
-            task_completion.wrong = wrong_answers
-            task_completion.save()
-
-            entity.update_streak()
-
-        return {
-            "message": "Answer processed, reward is given",
-            "is_correct": is_correct,
-        }
-
 
 class PlayGameView(APIView):
     permission_classes = [AllowAny]
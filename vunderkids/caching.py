@@ -0,0 +1,152 @@
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY_PREFIX = "view_cache_version"
+RESPONSE_KEY_PREFIX = "view_cache"
+STATS_KEY_PREFIX = "view_cache_stats"
+
+# Names of the views wrapped by ``cache_response``, for ``get_cache_stats``.
+cached_views = set()
+
+
+def _new_version():
+    # Seeded from the clock so a version evicted from the cache never comes
+    # back as one that cached responses are still stored under.
+    return int(time.time() * 1000)
+
+
+def version_key(scope):
+    return f"{VERSION_KEY_PREFIX}:{scope}"
+
+
+def get_versions(scopes):
+    """
+    Return the current version of every scope, creating missing ones.
+
+    A version is ``None`` when the cache is unavailable; callers then skip
+    the cache and read from the database.
+    """
+    keys = {scope: version_key(scope) for scope in scopes}
+    stored = cache.get_many(keys.values())
+    versions = {}
+    for scope, key in keys.items():
+        version = stored.get(key)
+        if version is None:
+            cache.add(key, _new_version(), None)
+            version = cache.get(key)
+        versions[scope] = version
+    return versions
+
+
+def bump_version(scope):
+    """Invalidate every cached response that depends on ``scope``."""
+    key = version_key(scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+
+
+def learner_scope(user_id=None, child_id=None):
+    if user_id is not None:
+        return f"learner:user:{user_id}"
+    return f"learner:child:{child_id}"
+
+
+def _learner_scopes(request):
+    if not request.user.is_authenticated:
+        return []
+    scopes = [learner_scope(user_id=request.user.pk)]
+    child_id = request.query_params.get("child_id")
+    if child_id:
+        scopes.append(learner_scope(child_id=child_id))
+    return scopes
+
+
+def _incr(key):
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def cache_response(*scopes, per_learner=False, timeout=None):
+    """
+    Cache the data of successful responses of a DRF view method.
+
+    Responses are keyed by the request path and query string and by the
+    version of every ``scope`` they depend on; ``bump_version(scope)`` makes
+    them stale. With ``per_learner`` the key also includes the requesting
+    user and the ``learner:*`` scopes of that user and of the ``child_id``
+    query parameter.
+    """
+
+    def decorator(view_method):
+        name = view_method.__qualname__
+        cached_views.add(name)
+
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            view_scopes = list(scopes)
+            identity = ""
+            if per_learner:
+                view_scopes += _learner_scopes(request)
+                identity = str(request.user.pk or "anon")
+            versions = get_versions(view_scopes)
+            if None in versions.values():
+                return view_method(self, request, *args, **kwargs)
+            query = urlencode(sorted(request.query_params.items()))
+            version_part = ":".join(str(versions[scope]) for scope in view_scopes)
+            key = (
+                f"{RESPONSE_KEY_PREFIX}:{request.path}?{query}:{identity}:"
+                f"{version_part}"
+            )
+
+            data = cache.get(key)
+            if data is not None:
+                _incr(f"{STATS_KEY_PREFIX}:hits:{name}")
+                return Response(data)
+
+            _incr(f"{STATS_KEY_PREFIX}:misses:{name}")
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(
+                    key,
+                    response.data,
+                    settings.VIEW_CACHE_TIMEOUT if timeout is None else timeout,
+                )
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def get_cache_stats():
+    """Return the hit and miss counts of every cached view."""
+    names = sorted(cached_views)
+    stored = cache.get_many(
+        [
+            f"{STATS_KEY_PREFIX}:{kind}:{name}"
+            for name in names
+            for kind in ("hits", "misses")
+        ]
+    )
+    stats = {}
+    for name in names:
+        hits = stored.get(f"{STATS_KEY_PREFIX}:hits:{name}", 0)
+        misses = stored.get(f"{STATS_KEY_PREFIX}:misses:{name}", 0)
+        total = hits + misses
+        stats[name] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else None,
+        }
+    return stats
@@ -36,6 +36,14 @@ app.conf.beat_schedule = {
         "task": "account.tasks.check_streaks",
         "schedule": crontab(hour=23, minute=58),
     },
+    "send-outbox-emails-every-minute": {
+        "task": "account.tasks.send_outbox_emails",
+        "schedule": crontab(),
+    },
+    "purge-outbox-emails-every-night": {
+        "task": "account.tasks.purge_outbox_emails",
+        "schedule": crontab(hour=3, minute=3),
+    },
     "delete-expired-subscriptions-every-night": {
         "task": "account.tasks.delete_expired_subscriptions",
         "schedule": crontab(hour=2, minute=2),
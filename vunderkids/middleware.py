@@ -1,30 +1,142 @@
 # middleware.py
+import logging
+import math
+import re
 import time
+
+from django.conf import settings
+from django.core.cache import caches
 from django.http import HttpResponse
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_KEY_PREFIX = "ratelimit"
+RATE_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """Turn a rate such as ``"100/minute"`` into ``(requests, seconds)``."""
+    count, period = rate.split("/")
+    return int(count), RATE_PERIODS[period[0]]
+
+
+class SlidingWindowLimiter:
+    """
+    Sliding-window counter kept in a shared cache.
+
+    Each client has one counter per fixed window; the request count over the
+    last ``period`` seconds is estimated from the current window plus the
+    part of the previous window that still overlaps it. That takes two cache
+    keys per client and a constant amount of work per request, and the limit
+    holds across every worker sharing the cache.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def hit(self, key, limit, period, now=None):
+        """
+        Count a request against ``key`` unless it is over ``limit`` requests
+        per ``period`` seconds. Returns ``None`` when the request is allowed,
+        otherwise the number of seconds to wait before retrying.
+        """
+        now = time.time() if now is None else now
+        window = int(now // period)
+        elapsed = now - window * period
+        current_key = f"{RATE_LIMIT_KEY_PREFIX}:{key}:{window}"
+        previous_key = f"{RATE_LIMIT_KEY_PREFIX}:{key}:{window - 1}"
+
+        counts = self.cache.get_many([previous_key, current_key])
+        previous = counts.get(previous_key, 0)
+        current = counts.get(current_key, 0)
+        weight = 1 - elapsed / period
+        if previous * weight + current >= limit:
+            return self._retry_after(limit, period, elapsed, previous, current)
+
+        # The counter outlives its window by one period so the next window
+        # can still weigh it.
+        if not self.cache.add(current_key, 1, timeout=2 * period):
+            try:
+                self.cache.incr(current_key)
+            except ValueError:
+                self.cache.set(current_key, 1, timeout=2 * period)
+        return None
+
+    @staticmethod
+    def _retry_after(limit, period, elapsed, previous, current):
+        if current >= limit or not previous:
+            wait = period - elapsed
+        else:
+            # Time until the overlapping share of the previous window has
+            # shrunk enough to leave room for one more request.
+            wait = period * (1 - (limit - current) / previous) - elapsed
+        return max(1, math.ceil(wait))
+
 
 class RateLimitMiddleware:
+    """
+    Limit requests per client and route group, as configured by
+    ``RATE_LIMIT_GROUPS``.
+
+    Requests carrying a valid access token are counted per user with the
+    group's ``user`` rate, all others per IP address with its ``anon`` rate.
+    Rejected requests get a 429 response with a ``Retry-After`` header.
+    Requests are let through when the cache is unavailable.
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
-        self.visitors = {}
+        self.limiter = SlidingWindowLimiter(caches[settings.RATE_LIMIT_CACHE])
+        self.groups = [
+            (
+                group["name"],
+                re.compile(group["pattern"]),
+                parse_rate(group["anon"]),
+                parse_rate(group["user"]),
+            )
+            for group in settings.RATE_LIMIT_GROUPS
+        ]
+
+    def _get_group(self, path):
+        for name, pattern, anon_rate, user_rate in self.groups:
+            if pattern.search(path):
+                return name, anon_rate, user_rate
+        return None
+
+    @staticmethod
+    def _get_user_id(request):
+        header = request.META.get(jwt_settings.AUTH_HEADER_NAME, "").split()
+        if len(header) != 2 or header[0] not in jwt_settings.AUTH_HEADER_TYPES:
+            return None
+        try:
+            return AccessToken(header[1]).get(jwt_settings.USER_ID_CLAIM)
+        except TokenError:
+            return None
 
     def __call__(self, request):
-        ip_address = request.META.get('REMOTE_ADDR')
-        current_time = time.time()
-        time_window = 60  # 1 minute
-        max_requests = 100  # limit to 100 requests per minute
-
-        if ip_address not in self.visitors:
-            self.visitors[ip_address] = []
-
-        
-        # Filter out timestamps older than the time window
-        self.visitors[ip_address] = [timestamp for timestamp in self.visitors[ip_address] if timestamp > current_time - time_window]
-        
-        if len(self.visitors[ip_address]) >= max_requests:
-            return HttpResponse("Too many requests", status=429)
-        
-        # Record new request timestamp
-        self.visitors[ip_address].append(current_time)
-
-        response = self.get_response(request)
-        return response
+        group = self._get_group(request.path)
+        if group is None:
+            return self.get_response(request)
+
+        name, anon_rate, user_rate = group
+        user_id = self._get_user_id(request)
+        if user_id is not None:
+            client, (limit, period) = f"user:{user_id}", user_rate
+        else:
+            client = f"ip:{request.META.get('REMOTE_ADDR')}"
+            limit, period = anon_rate
+
+        try:
+            retry_after = self.limiter.hit(f"{name}:{client}", limit, period)
+        except Exception:
+            logger.warning("Rate limit cache unavailable", exc_info=True)
+            retry_after = None
+        if retry_after is not None:
+            response = HttpResponse("Too many requests", status=429)
+            response["Retry-After"] = str(retry_after)
+            return response
+
+        return self.get_response(request)
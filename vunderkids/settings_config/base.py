@@ -84,6 +84,7 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_EXP_CLAIM": "refresh_exp",
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
+    "TOKEN_REFRESH_SERIALIZER": "account.serializers.MyTokenRefreshSerializer",
 }
 
 MIDDLEWARE = [
@@ -170,6 +171,17 @@ EMAIL_HOST_USER = "vunderkidsedu@gmail.com"
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = "vunderkidsedu@gmail.com"
 
+# Outgoing mail is queued in the OutboxEmail table and sent by a worker.
+EMAIL_OUTBOX_BATCH_SIZE = 100
+# Messages per second across all outbox workers, 0 for no limit. At 200 a
+# 100k-recipient daily send drains in under ten minutes; lower it to the
+# limit of the SMTP provider.
+EMAIL_OUTBOX_RATE = 200
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = 60  # seconds, doubled on every failed attempt
+EMAIL_OUTBOX_LEASE = 600  # seconds a worker may hold claimed messages
+EMAIL_OUTBOX_RETENTION_DAYS = 7  # days before sent and failed messages are purged
+
 HALYK_TERMINAL_ID = os.getenv("HALYK_TERMINAL_ID")
 HALYK_CLIENT_ID = os.getenv("HALYK_CLIENT_ID")
 HALYK_CLIENT_SECRET = os.getenv("HALYK_CLIENT_SECRET")
@@ -213,3 +225,49 @@ else:
 
 CELERY_BROKER_URL = "redis://redis:6379/0"
 CELERY_RESULT_BACKEND = "redis://redis:6379/0"
+
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://redis:6379/2")
+# Cache errors are logged and treated as misses, so an unreachable Redis
+# makes requests fall back to the database instead of failing. Invalidations
+# made during an outage are lost; cached entries expire with their timeouts.
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": CACHE_REDIS_URL,
+        "OPTIONS": {"IGNORE_EXCEPTIONS": True, "SOCKET_CONNECT_TIMEOUT": 1},
+    }
+}
+DJANGO_REDIS_LOG_IGNORED_EXCEPTIONS = True
+# Lifetime of responses cached by vunderkids.caching.cache_response, which
+# are also invalidated whenever the data they depend on changes.
+VIEW_CACHE_TIMEOUT = 60 * 15
+
+# Requests are rate limited per route group, counted per user for requests
+# with an access token and per IP address otherwise. The first group whose
+# pattern matches the path applies. Anonymous auth requests are counted per
+# IP, and a whole class behind one school NAT logs in at the start of a
+# lesson, so that rate leaves room for a few classes at once.
+RATE_LIMIT_CACHE = "default"
+RATE_LIMIT_GROUPS = [
+    {
+        "name": "auth",
+        "pattern": r"^/api/(login|token/refresh|register-\w+|reset-password|activate)/",
+        "anon": "200/minute",
+        "user": "20/minute",
+    },
+    {
+        "name": "answers",
+        "pattern": r"^/api/.*/answers?/$",
+        "anon": "60/minute",
+        "user": "120/minute",
+    },
+    {
+        "name": "default",
+        "pattern": r"",
+        "anon": "100/minute",
+        "user": "300/minute",
+    },
+]
+
+LEADERBOARD_STORE = "account.leaderboard.RedisLeaderboardStore"
+LEADERBOARD_REDIS_URL = os.getenv("LEADERBOARD_REDIS_URL", "redis://redis:6379/1")
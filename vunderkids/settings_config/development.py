@@ -6,3 +6,13 @@ ALLOWED_HOSTS = ["*"]
 CORS_ALLOW_ALL_ORIGINS = True
 FRONTEND_URL = "http://localhost:5173/"
 BACKEND_URL = "http://localhost:8000/"
+
+LEADERBOARD_STORE = os.getenv(
+    "LEADERBOARD_STORE", "account.leaderboard.LocMemLeaderboardStore"
+)
+
+# Without a Redis URL every process keeps its own cache.
+if not os.getenv("CACHE_REDIS_URL"):
+    CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }